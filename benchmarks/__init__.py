@@ -0,0 +1,4 @@
+"""
+オフラインのベンチマーク
+スタブのLINEサーバーと偽のGrokクライアントでBotを動かし、配信の性能を計測する
+"""
@@ -0,0 +1,220 @@
+"""
+配信ベンチマーク
+スタブのLINEサーバーと偽のGrokクライアントでBotを実行し、配信対象の人数ごとに
+リクエスト数/秒・配信完了までの時間（p50/p99）・ピークメモリを計測して JSON で出力する。
+
+使い方:
+    python -m benchmarks.delivery --bot 3
+    python -m benchmarks.delivery --bot 6 --audiences 1,1000,100000 --line-latency-ms 50 --rate-429 0.01
+    python -m benchmarks.delivery --bot 3 --delivery-mode push --audiences 1,100,1000 --output result.json
+    python -m benchmarks.delivery --bot 3 --audience-source sqlite --audiences 1000,100000
+    python -m benchmarks.delivery --bot 3 --delivery-mode push --audiences 10000 --max-in-flight 16
+"""
+
+import argparse
+import contextlib
+import importlib
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional
+
+import requests
+
+from benchmarks.fake_grok import FakeGrokClient
+from benchmarks.stub_line import start_in_background
+from botlib import BaseConfig, GrokClientManager, LineAPI
+from botlib.audience import AudienceStore
+from run_bots import BOT_MODULES, resolve_bot_names
+
+# 既定で計測する配信対象の人数
+DEFAULT_AUDIENCES = [1, 10, 100, 1000, 10000, 100000]
+
+# 偽のクライアント・スタブに渡すトークン
+BENCHMARK_TOKEN = "benchmark"
+
+
+def percentile(values: List[float], percent: float) -> Optional[float]:
+    """パーセンタイル（最近傍順位法）"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(percent / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def iter_user_ids(count: int) -> Iterator[str]:
+    """LINE の User ID と同じ形式（U + 32桁の16進数）のダミーIDを作成"""
+    return (f"U{i:032x}" for i in range(count))
+
+
+def make_bot_class(bot_module, args, state_dir: str, audience: int):
+    """ベンチマーク用に設定を差し替えたBotクラスを作成（配信対象は環境変数の形式か登録簿に用意する）"""
+    base_config = bot_module.Config
+    overrides = {
+        "XAI_API_KEY": BENCHMARK_TOKEN,
+        "LINE_CHANNEL_ACCESS_TOKEN": BENCHMARK_TOKEN,
+        "AUDIENCE_SOURCE": args.audience_source,
+        "AUDIENCE_DB": None,
+        "LINE_USER_IDS_RAW": None,
+        "LINE_DELIVERY_MODE": args.delivery_mode,
+        "LINE_MAX_IN_FLIGHT": args.max_in_flight,
+        "STATE_DIR": state_dir,
+        # 毎回Grok（偽）に問い合わせて生成時間も含めて計測する
+        "ANSWER_CACHE_ENABLED": False,
+        "GROK_STREAMING": args.streaming,
+    }
+    if args.audience_source == "sqlite":
+        store = AudienceStore(os.path.join(state_dir, "audience.sqlite3"), base_config.BOT_ID)
+        store.subscribe(iter_user_ids(audience))
+        store.close()
+    else:
+        overrides["LINE_USER_IDS_RAW"] = ",".join(iter_user_ids(audience))
+    config = type("BenchmarkConfig", (base_config,), overrides)
+    return type("BenchmarkBot", (bot_module.Bot,), {"config": config})
+
+
+def run_once(bot_module, args, base_url: str, audience: int) -> dict:
+    """指定した人数で1回実行して計測結果を返す"""
+    requests.post(f"{base_url}/reset", timeout=10)
+    
+    # 共有インスタンスを作り直し、偽のGrokクライアントを登録する
+    LineAPI.close_all()
+    GrokClientManager.close_all()
+    GrokClientManager._clients[BENCHMARK_TOKEN] = FakeGrokClient(args.grok_latency_ms / 1000, args.answer_chars)
+    
+    with tempfile.TemporaryDirectory(prefix="bot-benchmark-") as state_dir:
+        bot_class = make_bot_class(bot_module, args, state_dir, audience)
+        
+        tracemalloc.start()
+        started_at = time.time()
+        start = time.perf_counter()
+        output = sys.stdout if args.verbose else open(os.devnull, "w")
+        try:
+            with contextlib.redirect_stdout(output):
+                bot_class().execute("run")
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    
+    stats = requests.get(f"{base_url}/stats", timeout=60).json()
+    delivery_times = [seen - started_at for seen in stats["last_seen"]]
+    send_window = None
+    if stats["first_request_at"] is not None:
+        send_window = stats["last_request_at"] - stats["first_request_at"]
+    
+    return {
+        "audience": audience,
+        "elapsed_seconds": round(elapsed, 3),
+        "line_requests": stats["requests"],
+        "status_counts": stats["status_counts"],
+        "send_window_seconds": round(send_window, 3) if send_window is not None else None,
+        "requests_per_second": round(stats["requests"] / send_window, 1) if send_window else None,
+        "delivered_users": stats["recipients"],
+        "out_of_order": stats["out_of_order"],
+        "p50_delivery_seconds": _round(percentile(delivery_times, 50)),
+        "p99_delivery_seconds": _round(percentile(delivery_times, 99)),
+        "peak_memory_mb": round(peak / 1024 / 1024, 2),
+    }
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 3) if value is not None else None
+
+
+def git_revision() -> Optional[str]:
+    """計測したコードのリビジョン（バージョン間の比較用）"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    """メイン関数"""
+    parser = argparse.ArgumentParser(description="スタブのLINE・偽のGrokで配信性能を計測")
+    parser.add_argument("--bot", default="3", help="計測するBot（例: 3 / bot3）")
+    parser.add_argument("--audiences", default=",".join(map(str, DEFAULT_AUDIENCES)),
+                        help="配信対象の人数（カンマ区切り）")
+    parser.add_argument("--delivery-mode", choices=("multicast", "push"), default="multicast")
+    parser.add_argument("--audience-source", choices=("env", "sqlite"), default="env",
+                        help="配信対象の取得元（env: カンマ区切りの環境変数 / sqlite: 登録簿）")
+    parser.add_argument("--streaming", action="store_true", help="ストリーミング配信で計測")
+    parser.add_argument("--max-in-flight", type=int, default=BaseConfig.LINE_MAX_IN_FLIGHT,
+                        help="並行して送るLINEリクエストの最大数（LINE_MAX_IN_FLIGHT）")
+    parser.add_argument("--line-latency-ms", type=float, default=20.0, help="スタブLINEの応答遅延（ミリ秒）")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="スタブLINEが 429 を返す割合（0〜1）")
+    parser.add_argument("--retry-after", default=None, help="429 に付ける Retry-After（秒）")
+    parser.add_argument("--grok-latency-ms", type=float, default=500.0, help="偽Grokの1回答あたりの生成時間（ミリ秒）")
+    parser.add_argument("--answer-chars", type=int, default=3000, help="偽Grokの回答の文字数")
+    parser.add_argument("--output", help="結果の JSON を書き出すファイル（省略時は標準出力）")
+    parser.add_argument("--verbose", action="store_true", help="Botのログを表示")
+    args = parser.parse_args()
+    
+    name = resolve_bot_names([args.bot])[0]
+    bot_module = importlib.import_module(BOT_MODULES[name])
+    audiences = [int(value) for value in args.audiences.split(",") if value.strip()]
+    
+    process, base_url = start_in_background(args.line_latency_ms / 1000, args.rate_429, args.retry_after)
+    # LINE API の宛先をスタブに向ける（トークンバケットの作成前に差し替える）
+    LineAPI.PUSH_URL = f"{base_url}/v2/bot/message/push"
+    LineAPI.MULTICAST_URL = f"{base_url}/v2/bot/message/multicast"
+    
+    results = []
+    try:
+        for audience in audiences:
+            print(f"⏱️ {name}: {audience}人に配信中...", file=sys.stderr)
+            result = run_once(bot_module, args, base_url, audience)
+            print(f"   {result['elapsed_seconds']}秒 / {result['requests_per_second']} req/s / "
+                  f"p99 {result['p99_delivery_seconds']}秒 / ピークメモリ {result['peak_memory_mb']}MB",
+                  file=sys.stderr)
+            results.append(result)
+    finally:
+        LineAPI.close_all()
+        GrokClientManager.close_all()
+        process.terminate()
+    
+    report = {
+        "benchmark": "delivery",
+        "bot": name,
+        "revision": git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "parameters": {
+            "delivery_mode": args.delivery_mode,
+            "audience_source": args.audience_source,
+            "streaming": args.streaming,
+            "max_in_flight": args.max_in_flight,
+            "line_latency_ms": args.line_latency_ms,
+            "rate_429": args.rate_429,
+            "retry_after": args.retry_after,
+            "grok_latency_ms": args.grok_latency_ms,
+            "answer_chars": args.answer_chars,
+        },
+        "results": results,
+    }
+    
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
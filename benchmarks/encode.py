@@ -0,0 +1,102 @@
+"""
+LINEリクエスト本文の作成ベンチマーク
+1回の送信あたりに本文を作るCPU時間を、毎回メッセージごと JSON にする方式（従来）と、
+エンコード済みのメッセージに宛先だけを差し込む方式（LineAPI.encode_messages + build_body）で比べる。
+
+使い方:
+    python -m benchmarks.encode
+    python -m benchmarks.encode --messages 5 --answer-chars 4000 --sends 20000 --output result.json
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, List
+
+from benchmarks.delivery import git_revision, iter_user_ids
+from botlib.line import LineAPI
+
+
+def make_messages(count: int, chars: int) -> List[str]:
+    """絵文字・改行を含む、指定した長さのメッセージを作成"""
+    paragraph = "【質問1】今日のニュース📰\n\nこれはベンチマーク用の回答です。" * 4 + "\n\n"
+    text = (paragraph * (chars // len(paragraph) + 1))[:chars]
+    return [text] * count
+
+
+def legacy_body(to, messages: List[str]) -> bytes:
+    """従来の方式: 送信のたびにメッセージオブジェクトを作り、本文全体を JSON にする"""
+    data = {
+        "to": to,
+        "messages": [{"type": "text", "text": message} for message in messages]
+    }
+    return json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+
+def measure(build: Callable[[object], bytes], recipients: List, sends: int) -> float:
+    """本文を sends 回作ったときの1回あたりのCPU時間（マイクロ秒）"""
+    start = time.process_time()
+    for i in range(sends):
+        build(recipients[i % len(recipients)])
+    return (time.process_time() - start) / sends * 1_000_000
+
+
+def main():
+    """メイン関数"""
+    parser = argparse.ArgumentParser(description="LINEリクエスト本文の作成にかかるCPU時間を計測")
+    parser.add_argument("--messages", type=int, default=LineAPI.MAX_MESSAGES_PER_REQUEST, help="1リクエストのメッセージ数")
+    parser.add_argument("--answer-chars", type=int, default=3000, help="1メッセージの文字数")
+    parser.add_argument("--sends", type=int, default=10000, help="push で計測する送信回数（multicast はその1/50）")
+    parser.add_argument("--output", help="結果の JSON を書き出すファイル（省略時は標準出力）")
+    args = parser.parse_args()
+    
+    messages = make_messages(args.messages, args.answer_chars)
+    user_ids = list(iter_user_ids(1000))
+    chunks = [list(iter_user_ids(LineAPI.MULTICAST_MAX_RECIPIENTS))] * 4
+    
+    # 送信前に1回だけ行うエンコード（従来方式の1回分と比べるため、同じく計測しておく）
+    start = time.process_time()
+    encoded = LineAPI.encode_messages(messages)
+    encode_us = (time.process_time() - start) * 1_000_000
+    assert json.loads(LineAPI.build_body(user_ids[0], encoded)) == json.loads(legacy_body(user_ids[0], messages))
+    
+    results = []
+    for kind, recipients, sends in (("push", user_ids, args.sends), ("multicast", chunks, max(1, args.sends // 50))):
+        before = measure(lambda to: legacy_body(to, messages), recipients, sends)
+        after = measure(lambda to: LineAPI.build_body(to, encoded), recipients, sends)
+        results.append({
+            "kind": kind,
+            "sends": sends,
+            "before_us_per_send": round(before, 2),
+            "after_us_per_send": round(after, 2),
+            "speedup": round(before / after, 1) if after else None,
+        })
+        print(f"⏱️ {kind}: 従来 {before:.2f}µs → 差し込み {after:.2f}µs（1回あたりのCPU時間）", file=sys.stderr)
+    
+    report = {
+        "benchmark": "encode",
+        "revision": git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "parameters": {
+            "messages": args.messages,
+            "answer_chars": args.answer_chars,
+            "body_bytes": len(LineAPI.build_body(user_ids[0], encoded)),
+            "encode_once_us": round(encode_us, 2),
+        },
+        "results": results,
+    }
+    
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+偽のGrokクライアント
+xai_sdk の Client と同じ使い方（client.chat.create → append → sample / stream）で、
+指定した遅延のあと指定した長さの回答を返す。
+"""
+
+import time
+from typing import Iterator, Tuple
+
+
+class FakeUsage:
+    """トークン使用量（回答の長さから概算）"""
+    
+    def __init__(self, prompt: str, answer: str):
+        self.prompt_tokens = len(prompt)
+        self.completion_tokens = len(answer)
+        self.reasoning_tokens = 0
+        self.cached_prompt_text_tokens = 0
+
+
+class FakeResponse:
+    """chat.sample() の戻り値"""
+    
+    def __init__(self, content: str, prompt: str = ""):
+        self.content = content
+        self.usage = FakeUsage(prompt, content)
+        self.server_side_tool_usage = {}
+
+
+class FakeChunk:
+    """chat.stream() で返る差分"""
+    
+    def __init__(self, content: str):
+        self.content = content
+
+
+class FakeChat:
+    """1件の会話"""
+    
+    # ストリーミング時に1回で返す文字数
+    STREAM_CHUNK_CHARS = 50
+    
+    def __init__(self, client: "FakeGrokClient"):
+        self.client = client
+        self.messages = []
+    
+    def append(self, message) -> "FakeChat":
+        self.messages.append(message)
+        return self
+    
+    def _answer(self) -> str:
+        """段落の区切りを含む、指定した長さの回答を作成"""
+        paragraph = "これはベンチマーク用の回答です。" * 10 + "\n\n"
+        text = paragraph * (self.client.answer_chars // len(paragraph) + 1)
+        return text[:self.client.answer_chars]
+    
+    def sample(self) -> FakeResponse:
+        time.sleep(self.client.latency)
+        return FakeResponse(self._answer(), str(self.messages[-1]))
+    
+    def stream(self) -> Iterator[Tuple[FakeResponse, FakeChunk]]:
+        # 遅延の半分で最初のトークン、残りで全体を返す
+        text = self._answer()
+        size = FakeChat.STREAM_CHUNK_CHARS
+        pieces = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+        time.sleep(self.client.latency / 2)
+        interval = self.client.latency / 2 / len(pieces)
+        content = ""
+        for piece in pieces:
+            content += piece
+            yield FakeResponse(content), FakeChunk(piece)
+            time.sleep(interval)
+
+
+class _FakeChatNamespace:
+    """client.chat"""
+    
+    def __init__(self, client: "FakeGrokClient"):
+        self.client = client
+    
+    def create(self, model: str, tools=None, **kwargs) -> FakeChat:
+        return FakeChat(self.client)
+
+
+class FakeGrokClient:
+    """xai_sdk.Client の代わりに使う偽のクライアント"""
+    
+    def __init__(self, latency: float = 1.0, answer_chars: int = 3000):
+        self.latency = latency
+        self.answer_chars = answer_chars
+        self.chat = _FakeChatNamespace(self)
+    
+    def close(self) -> None:
+        pass
@@ -0,0 +1,186 @@
+"""
+LINE Messaging API のスタブサーバー
+push / multicast を受け付け、遅延と 429 の発生率を設定できる。宛先ごとの最終受信時刻を記録する。
+宛先ごとにメッセージの見出し（【質問N】と分割番号）を追い、前に受け付けたメッセージより前の番号が届いたら順番違いとして数える。
+
+単体でも起動できる:
+    python -m benchmarks.stub_line --port 8080 --latency-ms 50 --rate-429 0.01
+"""
+
+import argparse
+import json
+import multiprocessing
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+
+# メッセージの見出し（【質問N】と、分割した回答の「（2/3）」「（続き2）」）
+_HEADING = re.compile(r"【質問(\d+)】[^\n]*?(?:（(?:続き)?(\d+)(?:/\d+)?）)?\n")
+
+
+def message_order(text: str) -> Tuple[int, int]:
+    """メッセージの (質問番号, 分割番号)。見出しがなければ (0, 0)"""
+    match = _HEADING.match(text)
+    if match is None:
+        return 0, 0
+    return int(match.group(1)), int(match.group(2) or 1)
+
+
+class StubState:
+    """スタブサーバーの受信記録"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+    
+    def reset(self) -> None:
+        """記録を消去"""
+        with self.lock:
+            self.requests = 0
+            self.status_counts = {}
+            self.first_request_at: Optional[float] = None
+            self.last_request_at: Optional[float] = None
+            self.last_seen = {}          # 宛先 → 最後にメッセージを受け付けた時刻
+            self.last_order = {}         # 宛先 → 最後に受け付けたメッセージの (質問番号, 分割番号)
+            self.out_of_order = 0        # 前に受け付けたメッセージより前の番号が届いた回数
+            self.accepted_keys = {}      # X-Line-Retry-Key → 受付時のリクエストID
+    
+    def snapshot(self) -> dict:
+        """記録を JSON にできる形で取得"""
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "status_counts": dict(self.status_counts),
+                "first_request_at": self.first_request_at,
+                "last_request_at": self.last_request_at,
+                "recipients": len(self.last_seen),
+                "out_of_order": self.out_of_order,
+                "last_seen": list(self.last_seen.values()),
+            }
+
+
+def make_handler(state: StubState, latency: float, rate_429: float, retry_after: Optional[str]):
+    """設定を閉じ込めたリクエストハンドラを作成"""
+    
+    class Handler(BaseHTTPRequestHandler):
+        # keep-alive で接続を使い回せるようにする
+        protocol_version = "HTTP/1.1"
+        
+        def log_message(self, format, *args):
+            pass
+        
+        def _reply(self, status: int, body: dict, headers: Optional[dict] = None) -> None:
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+        
+        def do_GET(self):
+            if self.path == "/stats":
+                self._reply(200, state.snapshot())
+            else:
+                self._reply(404, {"message": "Not found"})
+        
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length)
+            
+            if self.path == "/reset":
+                state.reset()
+                self._reply(200, {})
+                return
+            if self.path not in ("/v2/bot/message/push", "/v2/bot/message/multicast"):
+                self._reply(404, {"message": "Not found"})
+                return
+            
+            if latency > 0:
+                time.sleep(latency)
+            
+            now = time.time()
+            status, reply, headers = self._handle_message(json.loads(body), now)
+            with state.lock:
+                # 並行して届いたリクエストは処理の終わる順が前後するので、最初・最後は最小・最大で持つ
+                handled_at = time.time()
+                state.requests += 1
+                state.status_counts[str(status)] = state.status_counts.get(str(status), 0) + 1
+                if state.first_request_at is None or now < state.first_request_at:
+                    state.first_request_at = now
+                if state.last_request_at is None or handled_at > state.last_request_at:
+                    state.last_request_at = handled_at
+            self._reply(status, reply, headers)
+        
+        def _handle_message(self, data: dict, now: float) -> Tuple[int, dict, dict]:
+            """メッセージ送信を処理（戻り値: ステータス, 本文, ヘッダー）"""
+            if random.random() < rate_429:
+                headers = {"Retry-After": retry_after} if retry_after else {}
+                return 429, {"message": "The API rate limit has been exceeded. Try again later."}, headers
+            
+            retry_key = self.headers.get("X-Line-Retry-Key")
+            request_id = uuid.uuid4().hex
+            recipients = data["to"] if isinstance(data["to"], list) else [data["to"]]
+            with state.lock:
+                if retry_key and retry_key in state.accepted_keys:
+                    # 本物と同じく、受付済みのリトライキーは 409 で受付時のリクエストIDを返す
+                    accepted = state.accepted_keys[retry_key]
+                    return 409, {"message": "The retry key is already accepted"}, {"x-line-accepted-request-id": accepted}
+                if retry_key:
+                    state.accepted_keys[retry_key] = request_id
+                first = message_order(data["messages"][0]["text"])
+                last = message_order(data["messages"][-1]["text"])
+                for recipient in recipients:
+                    state.last_seen[recipient] = now
+                    if first != (0, 0) and state.last_order.get(recipient, (0, 0)) >= first:
+                        state.out_of_order += 1
+                    state.last_order[recipient] = last
+            return 200, {}, {"x-line-request-id": request_id}
+    
+    return Handler
+
+
+def serve(port: int, latency: float = 0.0, rate_429: float = 0.0, retry_after: Optional[str] = None,
+          ready=None) -> None:
+    """スタブサーバーを起動（ready が渡されていれば、待ち受けたポート番号を送る）"""
+    state = StubState()
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state, latency, rate_429, retry_after))
+    server.daemon_threads = True
+    if ready is not None:
+        ready.send(server.server_address[1])
+    server.serve_forever()
+
+
+def start_in_background(latency: float = 0.0, rate_429: float = 0.0,
+                        retry_after: Optional[str] = None) -> Tuple[multiprocessing.Process, str]:
+    """別プロセスでスタブサーバーを起動（戻り値: プロセス, ベースURL）
+
+    計測対象のプロセスのメモリ・CPUに影響しないよう、サーバーは別プロセスで動かす。
+    """
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=serve, args=(0, latency, rate_429, retry_after, sender), daemon=True)
+    process.start()
+    port = receiver.recv()
+    return process, f"http://127.0.0.1:{port}"
+
+
+def main():
+    """メイン関数"""
+    parser = argparse.ArgumentParser(description="LINE Messaging API のスタブサーバー")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="1リクエストあたりの応答遅延（ミリ秒）")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="429 を返す割合（0〜1）")
+    parser.add_argument("--retry-after", default=None, help="429 に付ける Retry-After（秒）")
+    args = parser.parse_args()
+    
+    print(f"スタブLINEサーバーを起動: http://127.0.0.1:{args.port}")
+    serve(args.port, args.latency_ms / 1000, args.rate_429, args.retry_after)
+
+
+if __name__ == "__main__":
+    main()
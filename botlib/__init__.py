@@ -0,0 +1,19 @@
+"""
+Grok → LINE 配信Bot 共通ライブラリ
+各Bot（bot1〜bot6）で共通の設定・Grok API・LINE API・実行処理をまとめる
+"""
+
+from botlib.config import BaseConfig
+from botlib.dates import DateUtils
+from botlib.grok import GrokAPI, GrokClientManager
+from botlib.line import LineAPI
+from botlib.bot import BaseBot
+
+__all__ = [
+    "BaseConfig",
+    "DateUtils",
+    "GrokAPI",
+    "GrokClientManager",
+    "LineAPI",
+    "BaseBot",
+]
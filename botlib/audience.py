@@ -0,0 +1,170 @@
+"""
+配信対象の登録簿
+配信対象（LINE User ID）をBotごとに SQLite へ登録し、multicast の宛先数ずつ順に読み出す。
+宛先を全件メモリに載せないので、配信対象が数万人になってもメモリ使用量は変わらない。
+登録・解除は manage_audience.py から行う。
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable, Iterator, List, Optional, Type
+
+from botlib.config import BaseConfig
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS members (
+    bot_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    subscribed_at REAL NOT NULL,
+    PRIMARY KEY (bot_id, user_id)
+) WITHOUT ROWID;
+"""
+
+# 登録・解除をまとめてコミットする件数
+_WRITE_CHUNK = 10000
+
+
+def _clean_ids(user_ids: Iterable[str]) -> Iterator[str]:
+    """前後の空白を除き、空の行を飛ばす"""
+    for user_id in user_ids:
+        user_id = user_id.strip()
+        if user_id:
+            yield user_id
+
+
+def _chunks(items: Iterable[str], size: int) -> Iterator[List[str]]:
+    """size 件ずつに区切る（全件をリストにしない）"""
+    chunk: List[str] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class EnvAudience:
+    """環境変数（LINE_USER_IDS_RAW のカンマ区切り）から読む配信対象"""
+    
+    source = "env"
+    
+    def __init__(self, config: Type[BaseConfig]):
+        self.user_ids = config.get_line_user_ids()
+    
+    def count(self) -> int:
+        """配信対象の人数"""
+        return len(self.user_ids)
+    
+    def iter_user_ids(self) -> Iterator[str]:
+        """配信対象を1人ずつ返す"""
+        return iter(self.user_ids)
+    
+    def iter_batches(self, size: int) -> Iterator[List[str]]:
+        """配信対象を size 人ずつ返す"""
+        for i in range(0, len(self.user_ids), size):
+            yield self.user_ids[i:i + size]
+
+
+class AudienceStore:
+    """SQLite の登録簿から読む配信対象（Botごとに登録を分ける）"""
+    
+    source = "sqlite"
+    
+    # 1回の問い合わせで読み出す件数（iter_user_ids 用）
+    PAGE_SIZE = 1000
+    
+    def __init__(self, path: str, bot_id: str):
+        self.path = path
+        self.bot_id = bot_id
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+    
+    @classmethod
+    def for_config(cls, config: Type[BaseConfig]) -> "AudienceStore":
+        """Botの設定から登録簿を開く（AUDIENCE_DB 未設定なら STATE_DIR/audience.sqlite3）"""
+        path = config.AUDIENCE_DB or os.path.join(config.STATE_DIR, "audience.sqlite3")
+        return cls(path, config.BOT_ID)
+    
+    def _connect(self) -> sqlite3.Connection:
+        """接続を取得（初回にテーブルを作成）"""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+    
+    def subscribe(self, user_ids: Iterable[str]) -> int:
+        """配信対象に登録（登録済みは無視）。新しく登録した人数を返す"""
+        added = 0
+        for chunk in _chunks(_clean_ids(user_ids), _WRITE_CHUNK):
+            now = time.time()
+            with self._lock:
+                conn = self._connect()
+                with conn:
+                    before = conn.total_changes
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO members (bot_id, user_id, subscribed_at) VALUES (?, ?, ?)",
+                        ((self.bot_id, user_id, now) for user_id in chunk)
+                    )
+                    added += conn.total_changes - before
+        return added
+    
+    def unsubscribe(self, user_ids: Iterable[str]) -> int:
+        """配信対象から解除。解除した人数を返す"""
+        removed = 0
+        for chunk in _chunks(_clean_ids(user_ids), _WRITE_CHUNK):
+            with self._lock:
+                conn = self._connect()
+                with conn:
+                    before = conn.total_changes
+                    conn.executemany(
+                        "DELETE FROM members WHERE bot_id = ? AND user_id = ?",
+                        ((self.bot_id, user_id) for user_id in chunk)
+                    )
+                    removed += conn.total_changes - before
+        return removed
+    
+    def count(self) -> int:
+        """配信対象の人数"""
+        with self._lock:
+            row = self._connect().execute("SELECT COUNT(*) FROM members WHERE bot_id = ?", (self.bot_id,)).fetchone()
+        return row[0]
+    
+    def iter_batches(self, size: int) -> Iterator[List[str]]:
+        """配信対象を User ID 順に size 人ずつ返す（キー順に読み進め、全件は読み込まない）"""
+        last_id = ""
+        while True:
+            with self._lock:
+                rows = self._connect().execute(
+                    "SELECT user_id FROM members WHERE bot_id = ? AND user_id > ? ORDER BY user_id LIMIT ?",
+                    (self.bot_id, last_id, size)
+                ).fetchall()
+            if not rows:
+                return
+            batch = [row[0] for row in rows]
+            yield batch
+            last_id = batch[-1]
+    
+    def iter_user_ids(self) -> Iterator[str]:
+        """配信対象を1人ずつ返す"""
+        for batch in self.iter_batches(self.PAGE_SIZE):
+            yield from batch
+    
+    def close(self) -> None:
+        """接続を閉じる"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def open_audience(config: Type[BaseConfig]):
+    """設定（AUDIENCE_SOURCE）に応じた配信対象を開く"""
+    if config.AUDIENCE_SOURCE == "sqlite":
+        return AudienceStore.for_config(config)
+    return EnvAudience(config)
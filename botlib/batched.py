@@ -0,0 +1,62 @@
+"""
+質問のまとめ生成（1回の問い合わせで全セクションを生成）
+Botの質問をセクションとして1つのプロンプトにまとめ、JSON スキーマで指定した形式の回答を
+セクションごとの回答に分けて使う。Web検索・X検索が1回分で済む。
+"""
+
+import json
+import re
+from typing import List, Optional, Sequence
+
+# 回答の JSON でセクションの回答を入れるキー（section_1, section_2, ...）
+SECTION_KEY = "section_{}"
+
+
+def build_schema(displays: Sequence[str]) -> dict:
+    """セクションごとの回答（文字列）を持つ JSON スキーマ"""
+    properties = {
+        SECTION_KEY.format(i): {"type": "string", "description": f"セクション{i}「{display}」の回答"}
+        for i, display in enumerate(displays, 1)
+    }
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False,
+    }
+
+
+def build_prompt(questions: Sequence[str]) -> str:
+    """各質問をセクションとして1つにまとめたプロンプト"""
+    sections = "\n\n".join(
+        f"===== セクション{i}（{SECTION_KEY.format(i)}） =====\n{question.strip()}"
+        for i, question in enumerate(questions, 1)
+    )
+    return f"""以下の{len(questions)}個のセクションの質問に、まとめて回答してください。
+Web検索とX検索は最初にまとめて行い、その結果を全セクションで使い回してください。
+
+回答は指定された JSON 形式で、各セクションの回答を {SECTION_KEY.format(1)} 〜 {SECTION_KEY.format(len(questions))} に入れてください。
+各セクションの回答は、そのセクションだけを読んでも分かる独立した文章にしてください（他のセクションを参照しない）。
+
+{sections}"""
+
+
+def parse_sections(content: str, count: int) -> List[Optional[str]]:
+    """回答の JSON をセクションごとの回答に分ける（取り出せなかったセクションはNone）
+
+    JSON として読めなければ ValueError を送出する。
+    """
+    text = content.strip()
+    # スキーマ指定が効かずにコードブロックで返ってきた場合
+    fenced = re.match(r"^```(?:json)?\s*(.*?)\s*```$", text, re.DOTALL)
+    if fenced:
+        text = fenced.group(1)
+    data = json.loads(text)
+    if not isinstance(data, dict):
+        raise ValueError("回答が JSON オブジェクトではありません")
+    
+    sections = []
+    for i in range(1, count + 1):
+        answer = data.get(SECTION_KEY.format(i))
+        sections.append(answer.strip() if isinstance(answer, str) and answer.strip() else None)
+    return sections
@@ -0,0 +1,1014 @@
+"""
+Botの実行処理（質問 → Grok → LINE配信）
+"""
+
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from typing import Callable, Hashable, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Type
+
+from botlib import batched
+from botlib.audience import open_audience
+from botlib.cache import AnswerCache
+from botlib.config import BaseConfig
+from botlib.console import safe_print, set_log_prefix
+from botlib.dedup import DuplicateFilter, DuplicateIndex
+from botlib.deferred import DeferredRequests
+from botlib.digest import DigestState
+from botlib.grok import DeferredFailedError, GrokAnswer, GrokAPI
+from botlib.journal import DeliveryJournal, PlannedRequest
+from botlib.ledger import BUDGET_EXCEEDED, BUDGET_OK, BUDGET_SOFT_LIMIT, UsageLedger
+from botlib.latency import LatencyTracker
+from botlib.line import EncodedMessages, LineAPI, NarrowcastError
+from botlib.metrics import RunMetrics, set_current_metrics
+from botlib.prepared import PreparedAnswers
+from botlib.sender import OrderedSender
+from botlib.text import LINE_TEXT_MAX_CHARS, StreamChunker, format_answer_messages, text_length
+
+
+class SelectedQuestion(NamedTuple):
+    """今回Grokに送る質問"""
+    number: int                     # generate_questions() での番号（1始まり）
+    question: str                   # Grokに送る質問文（差分配信の指示を含む）
+    display: str                    # 表示用テキスト
+    config: Type[BaseConfig]        # 使用する設定（予算に応じてモデルを変えたもの）
+
+
+class BaseBot:
+    """配信Botの基底クラス"""
+    
+    # ログに表示するBot名（例: "Bot 6: 海外サッカー情報（Web検索 + X検索有効）"）
+    TITLE = ""
+    
+    # 各Botで上書きする設定クラス・質問生成クラス
+    config: Type[BaseConfig] = BaseConfig
+    question_generator = None
+    
+    def __init__(self, log_prefix: str = ""):
+        # 複数Botを1プロセスで動かすときのログ接頭辞（例: "[bot3] "）
+        self.log_prefix = log_prefix
+        self.audience = open_audience(self.config)
+        self.line = LineAPI.for_token(self.config.LINE_CHANNEL_ACCESS_TOKEN, self.config)
+        self.cache = AnswerCache(self.config)
+        self.prepared = PreparedAnswers(self.config)
+        self.latency = LatencyTracker(self.config)
+        self.journal = DeliveryJournal(self.config)
+        self.metrics = RunMetrics(self.config)
+        self.ledger = UsageLedger(self.config)
+        self.digest = DigestState(self.config)
+        self.dedup = DuplicateFilter(self.config, DuplicateIndex(self.config))
+        self.deferred = DeferredRequests(self.config)
+        
+        # 実行開始から最初のメッセージ送信までの時間の計測用
+        self._started_at = time.perf_counter()
+        self._first_sent_at: Optional[float] = None
+    
+    def execute(self, mode: str = "run") -> None:
+        """実行モード（"run" / "submit" / "prepare" / "deliver" / "resume"）に応じてBotを実行"""
+        # このスレッドからのLINE送信をメトリクスに記録する
+        self.metrics = RunMetrics(self.config, mode)
+        set_current_metrics(self.metrics)
+        try:
+            if mode == "submit":
+                self.submit()
+            elif mode == "prepare":
+                self.prepare()
+            elif mode == "deliver":
+                self.deliver()
+            elif mode == "resume":
+                self.resume()
+            else:
+                self.run()
+        finally:
+            set_current_metrics(None)
+            self._write_metrics()
+    
+    def _write_metrics(self) -> None:
+        """メトリクスをファイルに書き出す（失敗しても実行結果には影響させない）"""
+        if not self.config.METRICS_ENABLED:
+            return
+        self.metrics.finish()
+        try:
+            directory = self.metrics.write()
+            safe_print(f"📈 メトリクスを保存しました: {directory}（実行時間 {self.metrics.total_seconds:.1f}秒）")
+        except OSError as e:
+            safe_print(f"⚠️ メトリクス保存エラー: {e}")
+    
+    def run(self) -> None:
+        """Botを実行"""
+        set_log_prefix(self.log_prefix)
+        self._started_at = time.perf_counter()
+        self._print_header()
+        
+        if self.config.GROK_STREAMING:
+            self._run_streaming()
+            return
+        if self.config.DELIVERY_PIPELINED and not self.config.GROK_BATCHED:
+            self._run_pipelined()
+            return
+        
+        # 質問と回答を取得
+        qa_pairs = self._get_answers()
+        
+        if not qa_pairs:
+            safe_print("\n⚠️ 回答を取得できませんでした")
+            return
+        
+        self._deliver(qa_pairs)
+    
+    def submit(self) -> None:
+        """質問を deferred でGrokに投入しておく（回答は run / prepare / deliver で回収する）"""
+        set_log_prefix(self.log_prefix)
+        self._print_header()
+        safe_print("📬 事前投入モード")
+        
+        if not self.config.GROK_DEFERRED:
+            safe_print("\n⚠️ このBotでは deferred 生成が無効です（GROK_DEFERRED）")
+            return
+        
+        selected = self._select_questions()
+        if self.config.GROK_BATCHED and len(selected) > 1:
+            prompt, schema, config = self._batched_request(selected)
+            requests = [("まとめ生成", prompt, config, schema)]
+        else:
+            requests = [(f"質問{i}", item.question, item.config, None) for i, item in enumerate(selected, 1)]
+        
+        submitted = 0
+        for label, question, config, schema in requests:
+            if self.cache.get(question) is not None:
+                safe_print(f"💾 {label} キャッシュ済みのため投入しません")
+                continue
+            try:
+                request_id = GrokAPI.submit_deferred(question, config, schema)
+                self.deferred.add(question, config.GROK_MODEL, request_id)
+                submitted += 1
+                safe_print(f"📬 {label} を投入しました: {request_id}")
+            except Exception as e:
+                safe_print(f"❌ {label} 投入エラー（配信時にその場で生成します）: {e}")
+        
+        hours = self.config.GROK_DEFERRED_MAX_AGE_SECONDS / 3600
+        safe_print(f"\n📬 {submitted}件を deferred で投入しました（{hours:.0f}時間以内の実行で回収します）")
+        safe_print("\n=== 完了 ===")
+    
+    def prepare(self) -> None:
+        """回答を事前生成して保存（LINEには送らない）"""
+        set_log_prefix(self.log_prefix)
+        self._print_header()
+        safe_print("📝 事前生成モード")
+        
+        qa_pairs = self._get_answers()
+        
+        if not qa_pairs:
+            safe_print("\n⚠️ 回答を取得できませんでした")
+            return
+        
+        self.prepared.save(qa_pairs)
+        safe_print(f"\n💾 {len(qa_pairs)}件の回答を保存しました: {self.prepared.path}")
+        safe_print("\n=== 完了 ===")
+    
+    def deliver(self) -> None:
+        """事前生成した回答を配信（なければその場で生成して配信）"""
+        set_log_prefix(self.log_prefix)
+        self._print_header()
+        safe_print("📮 配信モード")
+        
+        if self.prepared.is_delivered():
+            safe_print("\n⚠️ 事前生成された回答は配信済みです（二重配信を防ぐため終了）")
+            return
+        
+        qa_pairs, reason = self.prepared.load()
+        if qa_pairs is None:
+            safe_print(f"\n⚠️ {reason}。その場で回答を生成します")
+            qa_pairs = self._get_answers()
+        else:
+            safe_print(f"\n💾 事前生成された回答を使用: {len(qa_pairs)}件")
+        
+        if not qa_pairs:
+            safe_print("\n⚠️ 回答を取得できませんでした")
+            return
+        
+        self._deliver(qa_pairs)
+        self.prepared.mark_delivered()
+    
+    def resume(self) -> None:
+        """途中で止まった配信を再開（Grokには問い合わせず、未送信分だけを送る）"""
+        set_log_prefix(self.log_prefix)
+        self._print_header()
+        safe_print("🔁 再開モード")
+        
+        found = self.journal.find_incomplete_run()
+        if found is None:
+            safe_print("\n⚠️ 再開できる未完了の配信はありません")
+            return
+        
+        run_id, qa_pairs, batches = found
+        safe_print(f"\n📒 未完了の配信を再開: 回答{len(qa_pairs)}件 / "
+                   f"未送信 {self.journal.count_unsent(run_id)}リクエスト")
+        if self._send_planned(run_id, batches):
+            self._commit_digest()
+            if self.config.DEDUP_ENABLED:
+                self._commit_duplicates(lambda: self.dedup.register(qa_pairs))
+        self._print_timing()
+        
+        safe_print("\n=== 完了 ===")
+    
+    def _deliver(self, qa_pairs: List[Tuple[str, str]]) -> None:
+        """回答を全ユーザーに送信して完了を表示"""
+        qa_pairs = self._suppress_duplicates(qa_pairs)
+        if self._send_to_users(qa_pairs):
+            self._commit_digest()
+            if self.config.DEDUP_ENABLED:
+                self._commit_duplicates(self.dedup.commit)
+        self._print_timing()
+        
+        safe_print("\n=== 完了 ===")
+    
+    def _suppress_duplicates(self, qa_pairs: List[Tuple[str, str]],
+                             continued: bool = False) -> List[Tuple[str, str]]:
+        """最近配信した段落と似た段落を回答から省く（DEDUP_ENABLED のBotのみ。continued なら同じ配信の続き）"""
+        if not self.config.DEDUP_ENABLED:
+            return qa_pairs
+        try:
+            start = time.perf_counter()
+            filtered, removed = self.dedup.filter_answers(qa_pairs, continued)
+        except sqlite3.Error as e:
+            safe_print(f"⚠️ 既出チェックエラー（そのまま配信します）: {e}")
+            return qa_pairs
+        if removed:
+            safe_print(f"🔁 配信済みの話題と似た段落を{removed}件省きました（{time.perf_counter() - start:.2f}秒）")
+        return filtered
+    
+    def _commit_duplicates(self, register) -> None:
+        """配信した段落を既出チェックの索引に登録"""
+        try:
+            count = register()
+        except sqlite3.Error as e:
+            safe_print(f"⚠️ 既出チェックの索引保存エラー: {e}")
+            return
+        if count:
+            safe_print(f"🔁 {count}件の段落を既出チェックの索引に登録しました")
+    
+    def _commit_digest(self) -> None:
+        """配信し終えた回答を、差分配信の「前回配信した内容」として確定"""
+        if not self.config.INCREMENTAL_DIGEST:
+            return
+        try:
+            count = self.digest.commit()
+        except OSError as e:
+            safe_print(f"⚠️ 差分配信の状態保存エラー: {e}")
+            return
+        if count:
+            safe_print(f"🧩 {count}件の回答を次回の差分配信用に保存しました")
+    
+    def _stage_digest(self, selected: List[SelectedQuestion], answers: List[Optional[str]]) -> None:
+        """生成した回答を差分配信の配信待ちとして保存"""
+        if not self.config.INCREMENTAL_DIGEST:
+            return
+        try:
+            self.digest.stage({
+                item.number: answer
+                for item, answer in zip(selected, answers)
+                if answer is not None
+            })
+        except OSError as e:
+            safe_print(f"⚠️ 差分配信の状態保存エラー: {e}")
+    
+    def _mark_sent(self) -> None:
+        """最初のメッセージを送信した時刻を記録"""
+        if self._first_sent_at is None:
+            self._first_sent_at = time.perf_counter()
+    
+    def _print_timing(self) -> None:
+        """送信時間の集計を表示"""
+        safe_print(f"\n⏱️ {self.line.timing_summary()}")
+        if self._first_sent_at is not None:
+            safe_print(f"⏱️ 最初のメッセージ送信まで: {self._first_sent_at - self._started_at:.2f}秒")
+    
+    def _run_pipelined(self) -> None:
+        """回答が届いた質問から順に配信（質問1を配信している間に質問2以降を生成する）
+        
+        配信は質問順に行い、失敗した質問は飛ばす。次の質問がすでに生成し終えていればまとめて送る。
+        配信ジャーナルには質問ごとに回答とメッセージのまとまりを追記し、差分配信の配信待ちにもその時点で加える
+        （途中で落ちても、--resume で配信し終えたときに送った回答の分が確定する）。
+        """
+        selected = self._select_questions()
+        if not selected:
+            safe_print("\n⚠️ 回答を取得できませんでした")
+            return
+        
+        max_workers = max(1, min(self.config.GROK_MAX_WORKERS, len(selected)))
+        safe_print(f"\n🚀 {len(selected)}件の質問を生成しながら配信（同時実行数: {max_workers}）")
+        
+        answers: List[Optional[str]] = []
+        all_batches: List[List[str]] = []
+        run_id: Optional[str] = None
+        delivered = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(self._ask, i, item.question, item.config)
+                for i, item in enumerate(selected, 1)
+            ]
+            while len(answers) < len(futures):
+                # 次の質問の回答を待ち、その後ろで生成し終えている質問もまとめる
+                first = len(answers)
+                answers.append(futures[first].result())
+                while len(answers) < len(futures) and futures[len(answers)].done():
+                    answers.append(futures[len(answers)].result())
+                
+                qa_pairs = [
+                    (item.display, answer)
+                    for item, answer in zip(selected[first:], answers[first:])
+                    if answer is not None
+                ]
+                if not qa_pairs:
+                    continue
+                
+                qa_pairs = self._suppress_duplicates(qa_pairs, continued=run_id is not None)
+                messages = self._build_messages(qa_pairs, delivered + 1)
+                batches = LineAPI.pack_messages(messages)
+                if run_id is None:
+                    run_id = self.journal.start_run(qa_pairs, batches)
+                    first_batch = 0
+                else:
+                    first_batch = self.journal.extend_run(run_id, qa_pairs, batches)
+                all_batches.extend(batches)
+                
+                numbers = "・".join(str(n) for n in range(delivered + 1, delivered + len(qa_pairs) + 1))
+                safe_print(f"\n📦 質問{numbers}: {len(messages)}件のメッセージを{len(batches)}リクエストにまとめて送信")
+                self._plan_batches(run_id, range(first_batch, len(all_batches)))
+                self._stage_digest(selected[first:], answers[first:])
+                self._send_pending(run_id, all_batches, first_batch)
+                delivered += len(qa_pairs)
+        
+        self._print_usage()
+        if run_id is None:
+            safe_print("\n⚠️ 回答を取得できませんでした")
+            return
+        
+        if self._finish_run(run_id):
+            self._commit_digest()
+            if self.config.DEDUP_ENABLED:
+                self._commit_duplicates(self.dedup.commit)
+        self._print_timing()
+        
+        safe_print("\n=== 完了 ===")
+    
+    def _run_streaming(self) -> None:
+        """ストリーミングで回答を生成し、まとまった段落から順次送信
+        
+        質問は並列に生成し、送信は質問順に行う（質問2の塊は質問1を送り終えるまで待機）。
+        送信するときにすでに届いている塊は、最大5通まで1リクエストにまとめる。
+        """
+        selected = self._select_questions()
+        if not selected:
+            safe_print("\n⚠️ 回答を取得できませんでした")
+            return
+        
+        max_workers = max(1, min(self.config.GROK_MAX_WORKERS, len(selected)))
+        safe_print(f"\n🌊 ストリーミングモード（同時実行数: {max_workers}）")
+        
+        outputs = [queue.Queue() for _ in selected]
+        sent_messages = 0
+        failed_messages = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(self._stream_answer, i, item.question, item.display, outputs[i - 1], item.config)
+                for i, item in enumerate(selected, 1)
+            ]
+            
+            for numbers, messages in self._iter_stream_batches(outputs):
+                label = "・".join(str(n) for n in dict.fromkeys(numbers))
+                if self._send_stream_batch(messages):
+                    sent_messages += len(messages)
+                    safe_print(f"📨 質問{label} の一部を送信（{len(messages)}通 / {sum(map(len, messages))}文字）")
+                else:
+                    failed_messages += len(messages)
+                    safe_print(f"⚠️ 質問{label} の一部（{len(messages)}通）を送れなかった宛先があります")
+            answers = [future.result() for future in futures]
+        
+        self._print_usage()
+        if sent_messages == 0 and failed_messages == 0:
+            safe_print("\n⚠️ 回答を取得できませんでした")
+            return
+        
+        self._stage_digest(selected, answers)
+        if failed_messages:
+            # 届いていない宛先がいるので、次回の差分配信の基準にはしない
+            safe_print(f"\n⚠️ {failed_messages}通のメッセージを送れなかった宛先があります（差分配信の状態は更新しません）")
+        else:
+            self._commit_digest()
+        self._print_timing()
+        safe_print("\n=== 完了 ===")
+    
+    def _stream_answer(self, index: int, question: str, question_display: str, output: queue.Queue,
+                       config: Optional[Type[BaseConfig]] = None) -> Optional[str]:
+        """1件の質問をストリーミングで生成し、LINEで送れる塊ごとに output に入れる（最後に None）
+        
+        戻り値は回答全体（失敗時はNone）。
+        """
+        set_log_prefix(self.log_prefix)
+        config = config or self.config
+        header = f"【質問{index}】{question_display}\n\n"
+        chunker = StreamChunker(self.config.STREAM_MIN_CHUNK_CHARS, LINE_TEXT_MAX_CHARS - text_length(header))
+        part = 0
+        
+        def emit(pieces: List[str]) -> None:
+            # 全体の件数は生成が終わるまで分からないので、続きには「（続き2）」のように番号だけ付ける
+            nonlocal part
+            for piece in pieces:
+                part += 1
+                if part == 1:
+                    output.put(header + piece)
+                else:
+                    output.put(f"【質問{index}】（続き{part}）\n\n{piece}")
+        
+        start = time.perf_counter()
+        try:
+            cached = self.cache.get(question)
+            if cached is not None:
+                safe_print(f"💾 質問{index} キャッシュヒット: {len(cached)}文字")
+                self.metrics.record_question(index, "cache", time.perf_counter() - start, len(cached))
+                emit(chunker.feed(cached))
+                emit(chunker.flush())
+                return cached
+            
+            parts = []
+            stream = GrokAPI.stream_with_search(question, config)
+            for text in stream:
+                parts.append(text)
+                emit(chunker.feed(text))
+            emit(chunker.flush())
+            
+            answer = "".join(parts)
+            cost = self.ledger.record(stream.usage, config.GROK_MODEL)
+            safe_print(f"✅ 質問{index} 回答取得成功: {len(answer)}文字（概算 ${cost:.4f}）")
+            self.metrics.record_question(index, "ok", time.perf_counter() - start, len(answer), stream.usage)
+            if config is self.config:
+                self.cache.put(question, answer)
+            return answer
+        
+        except Exception as e:
+            safe_print(f"❌ 質問{index} エラー: {e}")
+            self.metrics.record_question(index, "error", time.perf_counter() - start)
+            return None
+        
+        finally:
+            output.put(None)
+    
+    @staticmethod
+    def _iter_stream_batches(outputs: List[queue.Queue]) -> Iterator[Tuple[List[int], List[str]]]:
+        """ストリーミングの塊を質問順に取り出し、1リクエストで送る分（質問番号, メッセージ）ずつ返す
+        
+        次の塊が届くまでは待つが、すでに届いている塊は MAX_MESSAGES_PER_REQUEST 通までまとめる。
+        """
+        numbers: List[int] = []
+        messages: List[str] = []
+        index = 0
+        while index < len(outputs):
+            try:
+                # まとめている途中なら待たずに取り出し、届いていなければそこまでを送る
+                message = outputs[index].get(block=not messages)
+            except queue.Empty:
+                yield numbers, messages
+                numbers, messages = [], []
+                continue
+            if message is None:
+                index += 1
+                continue
+            numbers.append(index + 1)
+            messages.append(message)
+            if len(messages) == LineAPI.MAX_MESSAGES_PER_REQUEST:
+                yield numbers, messages
+                numbers, messages = [], []
+        if messages:
+            yield numbers, messages
+    
+    def _send_stream_batch(self, messages: List[str]) -> bool:
+        """1リクエスト分のメッセージを全ユーザーに送信（配信方式は LINE_DELIVERY_MODE に従う。全員に送れたらTrue）"""
+        encoded = LineAPI.encode_messages(messages)
+        mode = self.config.LINE_DELIVERY_MODE
+        if mode in ("broadcast", "narrowcast"):
+            try:
+                self._send_channel_wide(mode, encoded)
+                safe_print(f"✅ {mode} 送信完了（{self._channel_wide_target()}）")
+                return True
+            except Exception as e:
+                safe_print(f"❌ {mode} 送信エラー: {e}")
+                return False
+        if mode == "push":
+            return self._push_fallback(self.audience.iter_user_ids(), encoded) == 0
+        return self._multicast_batch(encoded, self.audience.iter_batches(LineAPI.MULTICAST_MAX_RECIPIENTS)) == 0
+    
+    def _print_header(self) -> None:
+        """ヘッダー情報を表示"""
+        safe_print(f"=== {self.TITLE} ===")
+        safe_print(f"配信対象: {self._describe_audience()}")
+        safe_print(f"X検索期間: {self.config.describe_search_period()}")
+    
+    def _describe_audience(self) -> str:
+        """配信対象の説明（ログ表示用）"""
+        mode = self.config.LINE_DELIVERY_MODE
+        if mode in ("broadcast", "narrowcast"):
+            return f"{self._channel_wide_target()}（{mode}）"
+        return f"{self.audience.count()}人（{self.audience.source}）"
+    
+    def _channel_wide_target(self) -> str:
+        """broadcast / narrowcast の送信先（ログ表示用）"""
+        if self.config.LINE_DELIVERY_MODE == "narrowcast":
+            return f"オーディエンス {self.config.LINE_AUDIENCE_GROUP_ID}"
+        return "友だち全員"
+    
+    def _get_answers(self) -> List[Tuple[str, str]]:
+        """質問をGrokに送信して回答を取得（GROK_BATCHED ならまとめて1回、それ以外は1件ずつ）"""
+        selected = self._select_questions()
+        if not selected:
+            return []
+        
+        if self.config.GROK_BATCHED and len(selected) > 1:
+            answers = self._ask_batched(selected)
+        else:
+            answers = self._ask_each(list(enumerate(selected, 1)))
+        
+        self._print_usage()
+        self._stage_digest(selected, answers)
+        
+        # 質問順を保ったまま、失敗した質問だけを除外
+        return [
+            (item.display, answer)
+            for item, answer in zip(selected, answers)
+            if answer is not None
+        ]
+    
+    def _select_questions(self) -> List[SelectedQuestion]:
+        """質問を生成し、今日のGrok利用額に応じて省略・モデル変更する
+        
+        予算の GROK_BUDGET_SOFT_RATIO を超えたら任意の質問（OPTIONAL_QUESTIONS）を軽いモデルで生成し、
+        予算を超えたら任意の質問は省略して、残りを軽いモデルで生成する。
+        差分配信（INCREMENTAL_DIGEST）が有効なら、前回配信した内容の要約を質問に添える。
+        """
+        questions = self.question_generator.generate_questions()
+        status = self.ledger.budget_status()
+        downgrade_model = self.config.GROK_BUDGET_DOWNGRADE_MODEL
+        if status != BUDGET_OK:
+            limit = "上限" if status == BUDGET_EXCEEDED else f"{self.config.GROK_BUDGET_SOFT_RATIO:.0%}"
+            safe_print(f"💸 本日のGrok利用額 ${self.ledger.spent_today():.4f} が予算 "
+                       f"${self.config.GROK_DAILY_BUDGET_USD:.2f} の{limit}を超えています")
+        
+        selected = []
+        for number, question in enumerate(questions, 1):
+            question_display = self.question_generator.extract_display_text(question)
+            optional = number in self.config.OPTIONAL_QUESTIONS
+            if status == BUDGET_EXCEEDED and optional:
+                safe_print(f"💸 予算超過のため質問を省略: {question_display}")
+                continue
+            
+            config = self.config
+            downgrade = status == BUDGET_EXCEEDED or (status == BUDGET_SOFT_LIMIT and optional)
+            if downgrade and downgrade_model and downgrade_model != self.config.GROK_MODEL:
+                config = type(self.config.__name__, (self.config,), {"GROK_MODEL": downgrade_model})
+            
+            if self.config.INCREMENTAL_DIGEST:
+                incremental = self.digest.apply(number, question)
+                if incremental != question:
+                    safe_print(f"🧩 前回の配信以降の差分だけを生成: {question_display}")
+                question = incremental
+            selected.append(SelectedQuestion(number, question, question_display, config))
+        
+        for i, item in enumerate(selected, 1):
+            model_note = f"（{item.config.GROK_MODEL}）" if item.config is not self.config else ""
+            safe_print(f"\n質問 {i}: {item.display}{model_note}")
+        return selected
+    
+    def _print_usage(self) -> None:
+        """今日のGrok利用量を表示"""
+        today = self.ledger.today()
+        if not today:
+            return
+        budget = self.config.GROK_DAILY_BUDGET_USD
+        budget_str = f" / 予算 ${budget:.2f}" if budget > 0 else ""
+        safe_print(f"\n💰 本日のGrok利用（{self.config.BOT_ID}）: {today['questions']}件 / "
+                   f"トークン 入力{today.get('prompt_tokens', 0)}・出力{today.get('completion_tokens', 0)}"
+                   f"・推論{today.get('reasoning_tokens', 0)} / "
+                   f"検索 Web{today.get('web_search_calls', 0)}・X{today.get('x_search_calls', 0)}回 / "
+                   f"概算 ${today['cost_usd']:.4f}{budget_str}")
+    
+    def _ask_each(self, items: List[Tuple[int, SelectedQuestion]]) -> List[Optional[str]]:
+        """質問を1件ずつGrokに送信（GROK_MAX_WORKERS 件まで並列。items は (質問番号, 質問) のリスト）"""
+        max_workers = max(1, min(self.config.GROK_MAX_WORKERS, len(items)))
+        if max_workers == 1:
+            return [self._ask(i, item.question, item.config) for i, item in items]
+        
+        safe_print(f"\n🚀 {len(items)}件の質問を並列実行（同時実行数: {max_workers}）")
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(self._ask, i, item.question, item.config) for i, item in items]
+            return [future.result() for future in futures]
+    
+    def _ask_batched(self, selected: List[SelectedQuestion]) -> List[Optional[str]]:
+        """全質問を1つのプロンプトにまとめて1回で生成し、JSON の回答をセクションごとに分ける
+        
+        まとめ生成に失敗したり、回答を取り出せないセクションがあれば、その質問だけを1件ずつ問い合わせる。
+        """
+        set_log_prefix(self.log_prefix)
+        prompt, schema, config = self._batched_request(selected)
+        safe_print(f"\n📚 {len(selected)}件の質問を1回の問い合わせでまとめて生成")
+        
+        start = time.perf_counter()
+        status = "cache"
+        usage = None
+        content = self.cache.get(prompt)
+        try:
+            if content is None:
+                status = "ok"
+                # 1件ずつの回答時間とは分布が違うので、ヘッジの履歴には使わない
+                result = (self._collect_deferred("まとめ生成", prompt, config)
+                          or GrokAPI.ask_with_deadline(prompt, config, schema=schema))
+                content, usage = result.content, result.usage
+                safe_print(f"✅ まとめ生成成功: {len(content)}文字")
+            else:
+                safe_print(f"💾 まとめ生成 キャッシュヒット: {len(content)}文字")
+            answers = batched.parse_sections(content, len(selected))
+        except Exception as e:
+            safe_print(f"❌ まとめ生成エラー: {e}")
+            answers = [None] * len(selected)
+        elapsed = time.perf_counter() - start
+        
+        if usage is not None:
+            # 利用額は返ってきた使用量のとおりに記録し、質問数には取り出せたセクションだけを数える
+            # （取り出せなかった質問は、1件ずつ問い合わせたときに数える）
+            answered = sum(answer is not None for answer in answers)
+            cost = self.ledger.record(usage, config.GROK_MODEL, questions=answered)
+            safe_print(f"💰 まとめ生成 概算 ${cost:.4f}（{answered}/{len(selected)}件の回答を取り出せました）")
+        
+        for i, answer in enumerate(answers, 1):
+            if answer is None:
+                continue
+            # 1回分の使用量は、最初に取り出せたセクションにまとめて記録する
+            self.metrics.record_question(i, status, elapsed, len(answer), usage)
+            usage = None
+        
+        missing = [(i, item) for i, (item, answer) in enumerate(zip(selected, answers), 1) if answer is None]
+        if not missing:
+            # 軽いモデルに切り替えた回答は、通常の回答としてキャッシュしない
+            if status == "ok" and config is self.config:
+                try:
+                    self.cache.put(prompt, content)
+                except OSError as e:
+                    safe_print(f"⚠️ まとめ生成 キャッシュ保存エラー: {e}")
+            return answers
+        
+        safe_print(f"↩️ 回答を取り出せなかった{len(missing)}件の質問を1件ずつ問い合わせます")
+        for (i, _), answer in zip(missing, self._ask_each(missing)):
+            answers[i - 1] = answer
+        return answers
+    
+    def _batched_request(self, selected: List[SelectedQuestion]) -> Tuple[str, dict, Type[BaseConfig]]:
+        """まとめ生成のプロンプト・JSON スキーマ・使用する設定"""
+        # 軽いモデルに切り替えた質問があっても、通常のモデルの質問が残っていれば通常のモデルで生成する
+        config = next((item.config for item in selected if item.config is self.config), selected[0].config)
+        prompt = batched.build_prompt([item.question for item in selected])
+        schema = batched.build_schema([item.display for item in selected])
+        return prompt, schema, config
+    
+    def _collect_deferred(self, label: str, question: str, config: Type[BaseConfig]) -> Optional[GrokAnswer]:
+        """--submit で投入済みの質問なら、deferred の回答を回収する（なければ・回収できなければNone）
+        
+        待ち時間内に揃わなかっただけなら記録を残し、期限内の次の実行で回収できるようにする。
+        """
+        if not self.config.GROK_DEFERRED:
+            return None
+        request_id = self.deferred.get(question, config.GROK_MODEL)
+        if request_id is None:
+            return None
+        
+        start = time.perf_counter()
+        try:
+            result = GrokAPI.wait_deferred(request_id, config, self.config.GROK_DEFERRED_WAIT_SECONDS)
+        except DeferredFailedError as e:
+            safe_print(f"⚠️ {label} deferred の回答は期限切れ・失敗で回収できません（その場で生成します）: {e}")
+            self.deferred.remove(question, config.GROK_MODEL)
+            return None
+        except Exception as e:
+            safe_print(f"⚠️ {label} deferred の回答を回収できませんでした（その場で生成します）: {e}")
+            return None
+        
+        self.deferred.remove(question, config.GROK_MODEL)
+        safe_print(f"📬 {label} deferred の回答を回収しました（待ち時間 {time.perf_counter() - start:.1f}秒）")
+        return result
+    
+    def _ask(self, index: int, question: str, config: Optional[Type[BaseConfig]] = None) -> Optional[str]:
+        """1件の質問をGrokに送信（失敗時はNoneを返し、他の質問には影響させない）"""
+        set_log_prefix(self.log_prefix)
+        config = config or self.config
+        start = time.perf_counter()
+        cached = self.cache.get(question)
+        if cached is not None:
+            safe_print(f"💾 質問{index} キャッシュヒット: {len(cached)}文字")
+            self.metrics.record_question(index, "cache", time.perf_counter() - start, len(cached))
+            return cached
+        
+        try:
+            # ヘッジで打ち切った試行の使用量も、完了したときに台帳に加える
+            late_usage = partial(self.ledger.record, model=config.GROK_MODEL, questions=0)
+            result = (self._collect_deferred(f"質問{index}", question, config)
+                      or GrokAPI.ask_with_deadline(question, config, self.latency, on_late_usage=late_usage))
+            answer = result.content
+            cost = self.ledger.record(result.usage, config.GROK_MODEL)
+            safe_print(f"✅ 質問{index} 回答取得成功: {len(answer)}文字（概算 ${cost:.4f}）")
+            self.metrics.record_question(index, "ok", time.perf_counter() - start, len(answer), result.usage)
+        
+        except Exception as e:
+            safe_print(f"❌ 質問{index} エラー: {e}")
+            self.metrics.record_question(index, "error", time.perf_counter() - start)
+            return None
+        
+        # 軽いモデルに切り替えた回答は、通常の回答としてキャッシュしない
+        if config is not self.config:
+            return answer
+        try:
+            self.cache.put(question, answer)
+        except OSError as e:
+            safe_print(f"⚠️ 質問{index} キャッシュ保存エラー: {e}")
+        return answer
+    
+    def _send_to_users(self, qa_pairs: List[Tuple[str, str]]) -> bool:
+        """全ユーザーにメッセージを送信（送信予定を配信ジャーナルに記録してから送る。全件送れたらTrue）"""
+        messages = self._build_messages(qa_pairs)
+        batches = LineAPI.pack_messages(messages)
+        safe_print(f"\n📦 {len(messages)}件のメッセージを{len(batches)}リクエストにまとめて送信")
+        
+        run_id = self.journal.start_run(qa_pairs, batches)
+        self._plan_batches(run_id, range(len(batches)))
+        return self._send_planned(run_id, batches)
+    
+    def _plan_batches(self, run_id: str, batch_indexes: range) -> None:
+        """メッセージのまとまりを送るリクエスト（宛先 × まとまり）を配信ジャーナルに記録"""
+        mode = self.config.LINE_DELIVERY_MODE
+        if mode in ("broadcast", "narrowcast"):
+            # 宛先はLINE側で決まるので、メッセージのまとまりごとに1リクエストだけ送る
+            rows = ((batch_idx, mode, []) for batch_idx in batch_indexes)
+        elif mode == "push":
+            # ユーザーごとにメッセージの順番が保たれるよう、ユーザー単位で並べる
+            rows = (
+                (batch_idx, "push", [user_id])
+                for user_id in self.audience.iter_user_ids()
+                for batch_idx in batch_indexes
+            )
+        else:
+            # 宛先は登録簿から順に読む（まとまりごとに読み直し、全員分をメモリに載せない）
+            rows = (
+                (batch_idx, "multicast", chunk)
+                for batch_idx in batch_indexes
+                for chunk in self.audience.iter_batches(LineAPI.MULTICAST_MAX_RECIPIENTS)
+            )
+        planned = self.journal.plan_requests(run_id, rows)
+        safe_print(f"📒 配信ジャーナルに{planned}リクエストを記録")
+    
+    def _send_planned(self, run_id: str, batches: List[List[str]]) -> bool:
+        """配信ジャーナルの未送信リクエストを順に送信し、結果を記録（全件送れたらTrue）"""
+        self._send_pending(run_id, batches)
+        return self._finish_run(run_id)
+    
+    def _send_pending(self, run_id: str, batches: List[List[str]], first_batch: int = 0) -> None:
+        """配信ジャーナルの未送信リクエスト（first_batch 以降のまとまり）を送信し、結果を記録
+        
+        LINE_MAX_IN_FLIGHT 件まで並行して送る。push は User ID ごとに登録順を保ち、
+        multicast / broadcast / narrowcast は前のまとまりを送り終えてから次のまとまりを送る。
+        前のまとまりを送れなかった宛先への以降のまとまりは送らずに残し、--resume で順に送る。
+        """
+        # メッセージは最初に1回だけ JSON にエンコードし、リクエストごとには宛先だけを差し込む
+        encoded_batches = {i: LineAPI.encode_messages(batches[i]) for i in range(first_batch, len(batches))}
+        sender = OrderedSender(self.config.LINE_MAX_IN_FLIGHT)
+        for request in self.journal.unsent_before(run_id, first_batch):
+            for key in self._recipient_keys(request):
+                sender.hold(key)
+        
+        held = 0
+        last_batch = None
+        try:
+            for request in self.journal.iter_pending(run_id, first_batch):
+                if request.kind != "push":
+                    # 宛先が重なるので、まとまりが変わるところで前のまとまりの送信を待つ
+                    if last_batch is not None and request.batch_index != last_batch:
+                        sender.wait()
+                    last_batch = request.batch_index
+                    if request.kind == "multicast":
+                        request, split = self._split_held(run_id, request, sender)
+                        held += split
+                        if request is None:
+                            continue
+                batch = encoded_batches[request.batch_index]
+                sender.submit(self._send_key(request),
+                              partial(self._send_request, run_id, request, batch, len(batches), sender.hold))
+        finally:
+            sender.close()
+        
+        if sender.count:
+            safe_print(f"📤 LINE送信 {sender.rate_summary()}")
+            self.metrics.record_delivery(sender.count, sender.elapsed, sender.max_in_flight)
+        held += sender.held
+        if held:
+            safe_print(f"⏸️ 前のまとまりを送れなかった宛先への{held}件の送信を保留しました（--resume で順に送ります）")
+    
+    @staticmethod
+    def _send_key(request: PlannedRequest) -> Hashable:
+        """送信の順番を保つキー（push は User ID、broadcast / narrowcast は配信方式。multicast は1件ずつ並行に送る）"""
+        if request.kind == "push":
+            return request.recipients[0]
+        if request.kind == "multicast":
+            return request.seq
+        return request.kind
+    
+    @staticmethod
+    def _recipient_keys(request: PlannedRequest) -> List[Hashable]:
+        """リクエストが未送信のとき、以降のまとまりを保留にするキー（User ID か配信方式）"""
+        if request.kind in ("push", "multicast"):
+            return request.recipients
+        return [request.kind]
+    
+    def _split_held(self, run_id: str, request: PlannedRequest,
+                    sender: OrderedSender) -> Tuple[Optional[PlannedRequest], int]:
+        """multicast の宛先のうち保留中の人を未送信の push に分け、残りの人への multicast と保留した人数を返す"""
+        held = [user_id for user_id in request.recipients if sender.is_held(user_id)]
+        if not held:
+            return request, 0
+        
+        held_ids = set(held)
+        others = [user_id for user_id in request.recipients if user_id not in held_ids]
+        rows = ([("multicast", others)] if others else []) + [("push", [user_id]) for user_id in held]
+        replacements = self.journal.replace_request(run_id, request, rows)
+        return (replacements[0] if others else None), len(held)
+    
+    def _send_request(self, run_id: str, request: PlannedRequest, batch: EncodedMessages, total_batches: int,
+                      on_failed: Callable[[str], None]) -> bool:
+        """配信ジャーナルのリクエストを1件送信し、結果を記録（multicast が失敗したら push で再送）
+        
+        送れなかったら False を返す。multicast の push 再送で送れなかった宛先は on_failed に渡す。
+        """
+        label = f"リクエスト {request.batch_index + 1}/{total_batches}"
+        target = f"{len(request.recipients)}人" if request.recipients else self._channel_wide_target()
+        
+        try:
+            if request.kind == "push":
+                self.line.send_messages(request.recipients[0], batch, request.retry_key)
+            elif request.kind == "multicast":
+                self.line.multicast_messages(request.recipients, batch, request.retry_key)
+            else:
+                self._send_channel_wide(request.kind, batch, request.retry_key)
+            self._mark_sent()
+            self.journal.mark(request.seq, "sent")
+            safe_print(f"✅ {label} 送信完了（{request.kind} / {target} / {batch.count}件）")
+            return True
+        
+        except Exception as e:
+            safe_print(f"❌ {label} 送信エラー（{request.kind} / {target}）: {e}")
+            if request.kind == "multicast":
+                # 再送する push を全員分記録してから送る（記録できなければ multicast が未送信のまま残る）
+                try:
+                    pushes = self.journal.replace_request(run_id, request,
+                                                          (("push", [user_id]) for user_id in request.recipients))
+                except sqlite3.Error as journal_error:
+                    safe_print(f"⚠️ push 再送の記録エラー（--resume で送り直せます）: {journal_error}")
+                    for user_id in request.recipients:
+                        on_failed(user_id)
+                    return False
+                safe_print(f"↩️ {len(request.recipients)}人に push で再送します")
+                self._push_planned(pushes, batch, on_failed)
+                return True
+            
+            self.journal.mark(request.seq, "failed")
+            if isinstance(e, NarrowcastError) and e.failed:
+                # 受付済みのリトライキーでは送り直せないので、--resume では新しいキーで送る
+                self.journal.renew_retry_key(request.seq)
+            return False
+    
+    def _finish_run(self, run_id: str) -> bool:
+        """未送信のリクエストがなければ配信を完了として記録（全件送れたらTrue）"""
+        unsent = self.journal.count_unsent(run_id)
+        if unsent == 0:
+            self.journal.complete_run(run_id)
+            return True
+        safe_print(f"\n⚠️ {unsent}リクエストが未送信です（--resume で未送信分だけを再送できます）")
+        return False
+    
+    def _send_channel_wide(self, kind: str, batch: EncodedMessages, retry_key: Optional[str] = None) -> None:
+        """broadcast / narrowcast で1リクエスト分のメッセージを送信
+        
+        narrowcast は LINE 側の送信が終わるまで進捗を確認する（次のまとまりが先に届かないようにするため）。
+        失敗した・待機時間内に完了しなかった場合は NarrowcastError を送出する。
+        """
+        if kind == "broadcast":
+            self.line.broadcast_messages(batch, retry_key)
+            return
+        
+        request_id = self.line.narrowcast_messages(self.config.LINE_AUDIENCE_GROUP_ID, batch, retry_key)
+        progress = self.line.wait_narrowcast(request_id, self.config.LINE_NARROWCAST_WAIT_SECONDS,
+                                             self.config.LINE_NARROWCAST_POLL_SECONDS)
+        self._check_narrowcast_progress(request_id, progress)
+    
+    @staticmethod
+    def _check_narrowcast_progress(request_id: str, progress: dict) -> None:
+        """narrowcast の進捗（送信数・完了までの時間）を表示し、完了していなければ NarrowcastError を送出"""
+        phase = progress.get("phase", "unknown")
+        counts = f"成功 {progress.get('successCount', 0)}人 / 失敗 {progress.get('failureCount', 0)}人"
+        if phase not in LineAPI.NARROWCAST_DONE_PHASES:
+            raise NarrowcastError(f"narrowcast {request_id} が待機時間内に完了しませんでした（{phase} / {counts}）",
+                                  request_id, phase)
+        
+        duration = ""
+        accepted, completed = progress.get("acceptedTime"), progress.get("completedTime")
+        if accepted and completed:
+            seconds = (datetime.fromisoformat(completed.replace("Z", "+00:00"))
+                       - datetime.fromisoformat(accepted.replace("Z", "+00:00"))).total_seconds()
+            duration = f" / 受付から完了まで {seconds:.1f}秒"
+        if phase == "failed":
+            reason = progress.get("failedDescription") or progress.get("errorCode", "")
+            raise NarrowcastError(f"narrowcast {request_id} の送信に失敗しました（{reason} / {counts}{duration}）",
+                                  request_id, phase)
+        safe_print(f"📡 narrowcast {request_id}: 送信完了（{counts}{duration}）")
+    
+    def _push_planned(self, pushes: List[PlannedRequest], batch: EncodedMessages,
+                      on_failed: Callable[[str], None]) -> None:
+        """配信ジャーナルに記録済みの push 再送を送信（LINE_MAX_IN_FLIGHT 件まで並行。送れなかった宛先は on_failed に渡す）"""
+        failed = 0
+        failed_lock = threading.Lock()
+        
+        def send(retry: PlannedRequest) -> None:
+            nonlocal failed
+            user_id = retry.recipients[0]
+            try:
+                self.line.send_messages(user_id, batch, retry.retry_key)
+                self._mark_sent()
+                self.journal.mark(retry.seq, "sent")
+            
+            except Exception as e:
+                with failed_lock:
+                    failed += 1
+                self.journal.mark(retry.seq, "failed")
+                on_failed(user_id)
+                safe_print(f"❌ 再送エラー ({user_id}): {e}")
+        
+        # 再送は multicast のまとまりの中で終わらせるので、次のまとまりより先に届く
+        sender = OrderedSender(self.config.LINE_MAX_IN_FLIGHT)
+        try:
+            for retry in pushes:
+                sender.submit(retry.recipients[0], partial(send, retry))
+        finally:
+            sender.close()
+        
+        safe_print(f"↩️ push 送信完了: 成功 {len(pushes) - failed}人 / 失敗 {failed}人")
+    
+    @staticmethod
+    def _build_messages(qa_pairs: List[Tuple[str, str]], start: int = 1) -> List[str]:
+        """質問と回答から送信メッセージを作成（5000文字を超える回答は分割。質問番号は start から）"""
+        messages = []
+        for i, (question_display, answer) in enumerate(qa_pairs, start):
+            messages.extend(format_answer_messages(i, question_display, answer))
+        return messages
+    
+    def _multicast_batch(self, batch: EncodedMessages, chunks: Iterable[List[str]]) -> int:
+        """1リクエスト分のメッセージを全チャンクに multicast で送信（戻り値は push での再送にも失敗した人数）"""
+        failed = 0
+        for chunk_idx, chunk in enumerate(chunks, 1):
+            try:
+                self.line.multicast_messages(chunk, batch)
+                self._mark_sent()
+                safe_print(f"✅ チャンク {chunk_idx} 送信完了（{len(chunk)}人）")
+            
+            except Exception as e:
+                safe_print(f"❌ チャンク {chunk_idx} 送信エラー: {e}")
+                safe_print(f"↩️ {len(chunk)}人に push で再送します")
+                failed += self._push_fallback(chunk, batch)
+        return failed
+    
+    def _push_fallback(self, user_ids: Iterable[str], batch: EncodedMessages) -> int:
+        """指定した宛先へ push で個別に送信（LINE_MAX_IN_FLIGHT 件まで並行。multicast 失敗時の再送にも使う）
+        
+        戻り値は送信に失敗した人数。
+        """
+        failed = 0
+        failed_lock = threading.Lock()
+        
+        def send(user_id: str) -> None:
+            nonlocal failed
+            try:
+                self.line.send_messages(user_id, batch)
+                self._mark_sent()
+            
+            except Exception as e:
+                with failed_lock:
+                    failed += 1
+                safe_print(f"❌ 再送エラー ({user_id}): {e}")
+        
+        sender = OrderedSender(self.config.LINE_MAX_IN_FLIGHT)
+        try:
+            for user_id in user_ids:
+                sender.submit(user_id, partial(send, user_id))
+        finally:
+            sender.close()
+        
+        safe_print(f"↩️ push 送信完了: 成功 {sender.count - failed}人 / 失敗 {failed}人")
+        return failed
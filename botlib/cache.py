@@ -0,0 +1,104 @@
+"""
+Grok回答のディスクキャッシュ
+モデル・質問文・検索期間から作ったハッシュをキーに、回答を有効期限付きで保存する
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Optional, Type
+
+from botlib.config import BaseConfig
+
+
+class AnswerCache:
+    """Grok回答をファイルに保存するキャッシュ（件数・容量の上限を超えたら古い順に削除）"""
+    
+    def __init__(self, config: Type[BaseConfig]):
+        self.config = config
+        self.directory = os.path.join(config.STATE_DIR, "answer_cache", config.BOT_ID)
+        self._lock = threading.Lock()
+    
+    def make_key(self, question: str) -> str:
+        """モデル・質問文・検索期間からキャッシュキーを作成"""
+        material = json.dumps({
+            "model": self.config.GROK_MODEL,
+            "question": question,
+            "window": self.config.get_search_window_key(),
+        }, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+    
+    def _path(self, key: str) -> str:
+        """キーに対応するファイルパス"""
+        return os.path.join(self.directory, f"{key}.json")
+    
+    def get(self, question: str) -> Optional[str]:
+        """有効期限内の回答があれば返す"""
+        if not self.config.ANSWER_CACHE_ENABLED:
+            return None
+        
+        path = self._path(self.make_key(question))
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        
+        if time.time() - entry.get("created_at", 0) > self.config.ANSWER_CACHE_TTL_SECONDS:
+            return None
+        return entry.get("answer")
+    
+    def put(self, question: str, answer: str) -> None:
+        """回答を保存"""
+        if not self.config.ANSWER_CACHE_ENABLED:
+            return
+        
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(self.make_key(question))
+        entry = {
+            "created_at": time.time(),
+            "model": self.config.GROK_MODEL,
+            "answer": answer,
+        }
+        
+        # 書き込み途中のファイルを読まれないよう、一時ファイル経由で置き換える
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        
+        self._evict()
+    
+    def _evict(self) -> None:
+        """期限切れ・上限超過のエントリを古い順に削除"""
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            
+            entries.sort()
+            now = time.time()
+            total_bytes = sum(size for _, size, _ in entries)
+            count = len(entries)
+            
+            for mtime, size, path in entries:
+                expired = now - mtime > self.config.ANSWER_CACHE_TTL_SECONDS
+                over_limit = (count > self.config.ANSWER_CACHE_MAX_ENTRIES
+                              or total_bytes > self.config.ANSWER_CACHE_MAX_BYTES)
+                if not expired and not over_limit:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                count -= 1
+                total_bytes -= size
@@ -0,0 +1,37 @@
+"""
+Botのコマンドライン実行
+    python bot6_soccer.py             # 生成して配信（通常実行）
+    python bot6_soccer.py --submit    # 質問を deferred で先に投入（GROK_DEFERRED のBot）
+    python bot6_soccer.py --prepare   # 回答を事前生成して保存（投入済みなら回答を回収）
+    python bot6_soccer.py --deliver   # 事前生成した回答を配信
+    python bot6_soccer.py --resume    # 途中で止まった配信の未送信分だけを再送
+"""
+
+import argparse
+from typing import List, Optional
+
+RUN_MODES = ("run", "submit", "prepare", "deliver", "resume")
+
+
+def add_mode_arguments(parser: argparse.ArgumentParser) -> None:
+    """実行モードの引数を追加"""
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--mode", choices=RUN_MODES, default="run", help="実行モード")
+    group.add_argument("--submit", dest="mode", action="store_const", const="submit",
+                       help="質問を deferred でGrokに投入しておく（回答は run / prepare / deliver で回収）")
+    group.add_argument("--prepare", dest="mode", action="store_const", const="prepare",
+                       help="回答を事前生成して保存（LINEには送らない）")
+    group.add_argument("--deliver", dest="mode", action="store_const", const="deliver",
+                       help="事前生成した回答をLINEに送信")
+    group.add_argument("--resume", dest="mode", action="store_const", const="resume",
+                       help="途中で止まった配信の未送信分だけを再送（Grokには問い合わせない）")
+
+
+def run_bot_cli(bot_class, argv: Optional[List[str]] = None) -> None:
+    """引数に応じてBotを実行"""
+    parser = argparse.ArgumentParser(description=bot_class.TITLE)
+    add_mode_arguments(parser)
+    args = parser.parse_args(argv)
+    
+    bot = bot_class()
+    bot.execute(args.mode)
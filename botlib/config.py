@@ -0,0 +1,219 @@
+"""
+全Bot共通の設定
+各Botの Config はこのクラスを継承し、トークンや検索期間を上書きする
+"""
+
+import os
+from datetime import datetime, timezone, timedelta
+from typing import List, Dict, Optional, Tuple
+
+
+def env_int(name: str, default: int) -> int:
+    """環境変数を整数として取得（未設定・不正値はデフォルト）"""
+    value = os.environ.get(name)
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        print(f"⚠️ 環境変数 {name} の値が不正です: {value}（デフォルト {default} を使用）")
+        return default
+
+
+def env_float(name: str, default: float) -> float:
+    """環境変数を小数として取得（未設定・不正値はデフォルト）"""
+    value = os.environ.get(name)
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        print(f"⚠️ 環境変数 {name} の値が不正です: {value}（デフォルト {default} を使用）")
+        return default
+
+
+def env_bool(name: str, default: bool) -> bool:
+    """環境変数を真偽値として取得（"1", "true", "yes", "on" を真とする）"""
+    value = os.environ.get(name)
+    if not value:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+class BaseConfig:
+    """設定を管理する基底クラス"""
+    # Botの識別子（状態ファイルの保存先などに使う）
+    BOT_ID = "bot"
+    
+    XAI_API_KEY = os.environ.get('GROK_API_KEY')
+    LINE_CHANNEL_ACCESS_TOKEN: Optional[str] = None
+    LINE_USER_IDS_RAW: Optional[str] = None
+    
+    # 日本標準時のタイムゾーン
+    JST = timezone(timedelta(hours=9))
+    
+    # X検索の対象期間（日数）。X_SEARCH_HOURS が設定されていればそちらを優先
+    X_SEARCH_DAYS = 7
+    X_SEARCH_HOURS: Optional[int] = None
+    
+    # Grokのモデル
+    GROK_MODEL = "grok-4-1-fast"
+    
+    # Grokへの同時問い合わせ数（1なら逐次実行）
+    GROK_MAX_WORKERS = env_int('GROK_MAX_WORKERS', 3)
+    
+    # 1質問あたりの制限時間（秒）。リトライ・ヘッジを含めてこの時間で打ち切る
+    GROK_QUESTION_TIMEOUT_SECONDS = env_int('GROK_QUESTION_TIMEOUT_SECONDS', 240)
+    # 一時的なエラー（UNAVAILABLE など）のリトライ回数とバックオフ初期値（秒）
+    GROK_MAX_RETRIES = env_int('GROK_MAX_RETRIES', 2)
+    GROK_RETRY_BASE_SECONDS = env_int('GROK_RETRY_BASE_SECONDS', 2)
+    # ヘッジ: 回答が過去の回答時間の p90 を超えたら同じ質問をもう1本投げ、早い方を使う
+    GROK_HEDGING = env_bool('GROK_HEDGING', False)
+    GROK_HEDGE_PERCENTILE = env_int('GROK_HEDGE_PERCENTILE', 90)
+    GROK_HEDGE_MIN_SAMPLES = env_int('GROK_HEDGE_MIN_SAMPLES', 5)
+    
+    # ストリーミングで生成し、まとまった段落から順次LINEに送る
+    GROK_STREAMING = env_bool('GROK_STREAMING', False)
+    # ストリーミング時、1通にまとめる最小文字数（段落の区切りで送信）
+    # 送信はリクエストごとに宛先の人数分を1通と数えるので、小さくしすぎるとメッセージ通数が増える
+    STREAM_MIN_CHUNK_CHARS = env_int('STREAM_MIN_CHUNK_CHARS', 2000)
+    
+    # 回答が届いた質問から順に配信する（質問1の配信中に質問2以降を生成する）。まとめ生成・ストリーミング時は使わない
+    # 最初のメッセージは早く届くが、質問ごとに別のリクエストになりやすく、宛先ごとのメッセージ通数が増えるので既定は無効
+    DELIVERY_PIPELINED = env_bool('DELIVERY_PIPELINED', False)
+    
+    # まとめ生成: 全質問を1つのプロンプトにまとめ、JSON 形式の1回の回答をセクションごとに分ける（各Botで有効にする）
+    # 検索が1回分で済む。ストリーミング時は使わない
+    GROK_BATCHED = env_bool('GROK_BATCHED', False)
+    
+    # deferred 生成: --submit で質問を先に投入しておき、run / prepare / deliver で回答を回収する（各Botで有効にする）
+    GROK_DEFERRED = env_bool('GROK_DEFERRED', False)
+    # 回収時に生成中の回答を待つ最大時間（秒）。過ぎたらその場で生成する
+    GROK_DEFERRED_WAIT_SECONDS = env_int('GROK_DEFERRED_WAIT_SECONDS', 600)
+    # ポーリング間隔の最小値（秒。生成中ならバックオフで最大30秒まで延ばす）
+    GROK_DEFERRED_POLL_SECONDS = env_int('GROK_DEFERRED_POLL_SECONDS', 2)
+    # 投入した質問を回収に使える期限（秒）。deferred の回答は投入から24時間で消えるので、それより短くする
+    GROK_DEFERRED_MAX_AGE_SECONDS = env_int('GROK_DEFERRED_MAX_AGE_SECONDS', 20 * 60 * 60)
+    
+    # gRPCチャネルのキープアライブ間隔（秒）
+    GROK_KEEPALIVE_SECONDS = env_int('GROK_KEEPALIVE_SECONDS', 30)
+    
+    # プロセス全体でのGrok同時問い合わせ数の上限（複数Bot同時実行時に効く）
+    GROK_GLOBAL_MAX_IN_FLIGHT = env_int('GROK_GLOBAL_MAX_IN_FLIGHT', 6)
+    
+    # 配信対象の取得元（"env": LINE_USER_IDS_RAW のカンマ区切り / "sqlite": 配信対象の登録簿）
+    AUDIENCE_SOURCE = os.environ.get('AUDIENCE_SOURCE', 'env')
+    # 配信対象の登録簿（SQLite）。既定は STATE_DIR/audience.sqlite3（全Botで1ファイル、登録はBotごと）
+    AUDIENCE_DB = os.environ.get('AUDIENCE_DB')
+    
+    # LINEの配信方式（"multicast": 最大500人ずつまとめて送信 / "push": 1人ずつ送信 /
+    # "broadcast": チャネルの友だち全員に送信 / "narrowcast": オーディエンス（LINE_AUDIENCE_GROUP_ID）に送信）
+    # broadcast / narrowcast は配信対象（LINE_USER_IDS_RAW・登録簿）を使わない
+    LINE_DELIVERY_MODE = os.environ.get('LINE_DELIVERY_MODE', 'multicast')
+    # narrowcast の送信先オーディエンスID（チャネルごとに異なるので各Botで設定）
+    LINE_AUDIENCE_GROUP_ID: Optional[str] = None
+    # narrowcast の送信完了を待つ時間と、進捗を確認する間隔（秒）
+    LINE_NARROWCAST_WAIT_SECONDS = env_int('LINE_NARROWCAST_WAIT_SECONDS', 600)
+    LINE_NARROWCAST_POLL_SECONDS = env_int('LINE_NARROWCAST_POLL_SECONDS', 5)
+    
+    # LINE API の接続プールサイズとタイムアウト（秒）
+    LINE_POOL_SIZE = env_int('LINE_POOL_SIZE', 10)
+    # 並行して送るLINEリクエストの最大数（同じユーザーへのメッセージの順番は保つ）。接続プールもこの数以上にする
+    LINE_MAX_IN_FLIGHT = env_int('LINE_MAX_IN_FLIGHT', 8)
+    LINE_CONNECT_TIMEOUT = env_int('LINE_CONNECT_TIMEOUT', 5)
+    LINE_READ_TIMEOUT = env_int('LINE_READ_TIMEOUT', 30)
+    
+    # LINE API の送信レート上限（回/秒、チャネルアクセストークンごと）。公式の上限より余裕を持たせる
+    LINE_PUSH_RATE_PER_SECOND = env_int('LINE_PUSH_RATE_PER_SECOND', 1000)
+    LINE_MULTICAST_RATE_PER_SECOND = env_int('LINE_MULTICAST_RATE_PER_SECOND', 100)
+    # broadcast / narrowcast の送信レート上限（回/時）
+    LINE_BROADCAST_RATE_PER_HOUR = env_int('LINE_BROADCAST_RATE_PER_HOUR', 60)
+    
+    # 429・5xx・通信エラー時のリトライ（指数バックオフの初期値と、1リクエストあたりのリトライ時間の上限）
+    LINE_RETRY_BASE_SECONDS = env_int('LINE_RETRY_BASE_SECONDS', 1)
+    LINE_RETRY_MAX_SECONDS = env_int('LINE_RETRY_MAX_SECONDS', 60)
+    
+    # キャッシュなどの状態を保存するディレクトリ
+    STATE_DIR = os.environ.get('BOT_STATE_DIR', '.bot_state')
+    
+    # Grok回答キャッシュ（有効期限は各Botで上書き）
+    ANSWER_CACHE_ENABLED = env_bool('ANSWER_CACHE_ENABLED', True)
+    ANSWER_CACHE_TTL_SECONDS = 6 * 60 * 60
+    ANSWER_CACHE_MAX_ENTRIES = env_int('ANSWER_CACHE_MAX_ENTRIES', 500)
+    ANSWER_CACHE_MAX_BYTES = env_int('ANSWER_CACHE_MAX_BYTES', 20 * 1024 * 1024)
+    
+    # 事前生成した回答を配信に使える期限（秒）
+    PREPARED_MAX_AGE_SECONDS = env_int('PREPARED_MAX_AGE_SECONDS', 12 * 60 * 60)
+    
+    # 配信ジャーナル: 未完了の配信を resume モードで再開できる期限（秒）。X-Line-Retry-Key の有効期限（24時間）より短くする
+    JOURNAL_RESUME_MAX_AGE_SECONDS = env_int('JOURNAL_RESUME_MAX_AGE_SECONDS', 23 * 60 * 60)
+    # 配信ジャーナルの記録を残す期間（秒）
+    JOURNAL_RETENTION_SECONDS = env_int('JOURNAL_RETENTION_SECONDS', 7 * 24 * 60 * 60)
+    
+    # 実行ごとのメトリクス（Prometheus テキストファイル・JSON Lines）の出力。保存先の既定は STATE_DIR/metrics
+    METRICS_ENABLED = env_bool('METRICS_ENABLED', True)
+    METRICS_DIR = os.environ.get('METRICS_DIR')
+    
+    # Grokの料金（USD）。利用額の概算に使う（推論トークンは出力として計算）
+    GROK_PRICE_INPUT_PER_MTOK = env_float('GROK_PRICE_INPUT_PER_MTOK', 0.20)
+    GROK_PRICE_OUTPUT_PER_MTOK = env_float('GROK_PRICE_OUTPUT_PER_MTOK', 0.50)
+    GROK_PRICE_PER_1K_SEARCH_CALLS = env_float('GROK_PRICE_PER_1K_SEARCH_CALLS', 5.0)
+    
+    # Botごとの1日のGrok予算（USD、0なら無制限）。各Botで上書きしてもよい
+    GROK_DAILY_BUDGET_USD = env_float('GROK_DAILY_BUDGET_USD', 0.0)
+    # 予算のこの割合を超えたら任意の質問を GROK_BUDGET_DOWNGRADE_MODEL で生成する
+    GROK_BUDGET_SOFT_RATIO = env_float('GROK_BUDGET_SOFT_RATIO', 0.8)
+    # 予算に近づいたときに使う軽いモデル（未設定ならモデルは変えない）
+    GROK_BUDGET_DOWNGRADE_MODEL = os.environ.get('GROK_BUDGET_DOWNGRADE_MODEL') or None
+    # 予算を超えたら省略してよい質問の番号（1始まり）。各Botで上書きする
+    OPTIONAL_QUESTIONS: Tuple[int, ...] = ()
+    
+    # 差分配信: 前回配信した内容の要約を質問に添え、新しい動きだけを生成させる（各Botで有効にする）
+    INCREMENTAL_DIGEST = env_bool('INCREMENTAL_DIGEST', False)
+    # 前回配信した内容を差分配信に使う期限（秒）。これより古ければ全体を生成し直す
+    DIGEST_MAX_AGE_SECONDS = env_int('DIGEST_MAX_AGE_SECONDS', 48 * 60 * 60)
+    # 質問に添える要約の最大文字数
+    DIGEST_SUMMARY_MAX_CHARS = env_int('DIGEST_SUMMARY_MAX_CHARS', 1200)
+    
+    # 既出の話題の抑制: 最近配信した段落と似た段落を省く（各Botで有効にする）
+    DEDUP_ENABLED = env_bool('DEDUP_ENABLED', False)
+    # 省いた段落の扱い（"collapse": 「配信済みの話題のため省略」の1行にまとめる / "drop": 何も残さない）
+    DEDUP_ACTION = os.environ.get('DEDUP_ACTION', 'collapse')
+    # 既出とみなす類似度（推定 Jaccard 係数）と、比較の対象にする段落の最小文字数
+    DEDUP_THRESHOLD = env_float('DEDUP_THRESHOLD', 0.6)
+    DEDUP_MIN_CHARS = env_int('DEDUP_MIN_CHARS', 60)
+    # 配信した段落を比較の対象にする期間（秒）
+    DEDUP_WINDOW_SECONDS = env_int('DEDUP_WINDOW_SECONDS', 7 * 24 * 60 * 60)
+    
+    @classmethod
+    def get_line_user_ids(cls) -> List[str]:
+        """LINE User IDのリストを取得"""
+        if not cls.LINE_USER_IDS_RAW:
+            return []
+        return [uid.strip() for uid in cls.LINE_USER_IDS_RAW.split(',') if uid.strip()]
+    
+    @classmethod
+    def get_search_date_range(cls) -> Dict[str, datetime]:
+        """X検索の対象期間を取得"""
+        from botlib.dates import DateUtils
+        if cls.X_SEARCH_HOURS:
+            return DateUtils.get_date_range_hours(cls.X_SEARCH_HOURS)
+        return DateUtils.get_date_range(cls.X_SEARCH_DAYS)
+    
+    @classmethod
+    def get_search_window_key(cls) -> str:
+        """X検索の対象期間をキャッシュキー用の文字列で取得（時間指定なら時単位、日数指定なら日単位）"""
+        date_range = cls.get_search_date_range()
+        fmt = "%Y-%m-%dT%H" if cls.X_SEARCH_HOURS else "%Y-%m-%d"
+        return f"{date_range['from_date'].strftime(fmt)}~{date_range['to_date'].strftime(fmt)}"
+    
+    @classmethod
+    def describe_search_period(cls) -> str:
+        """X検索の対象期間を文字列で取得（ログ表示用）"""
+        from botlib.dates import DateUtils
+        date_range = cls.get_search_date_range()
+        if cls.X_SEARCH_HOURS:
+            date_range_str = DateUtils.format_date_range(date_range, with_time=True)
+            return f"{date_range_str} (過去{cls.X_SEARCH_HOURS}時間)"
+        date_range_str = DateUtils.format_date_range(date_range)
+        return f"{date_range_str} (過去{cls.X_SEARCH_DAYS}日)"
@@ -0,0 +1,32 @@
+"""
+ログ出力
+複数スレッドから print すると行が混ざるため、ロック付きで出力する。
+複数Botを1プロセスで動かすときは、スレッドごとに "[bot3] " のような接頭辞を付ける。
+"""
+
+import threading
+
+_print_lock = threading.Lock()
+_local = threading.local()
+
+
+def set_log_prefix(prefix: str) -> None:
+    """現在のスレッドのログ接頭辞を設定"""
+    _local.prefix = prefix
+
+
+def get_log_prefix() -> str:
+    """現在のスレッドのログ接頭辞を取得"""
+    return getattr(_local, "prefix", "")
+
+
+def safe_print(*args, sep: str = " ", **kwargs) -> None:
+    """スレッドセーフな print（接頭辞付き）"""
+    prefix = get_log_prefix()
+    if prefix:
+        text = sep.join(str(arg) for arg in args)
+        body = text.lstrip("\n")
+        text = text[:len(text) - len(body)] + prefix + body.replace("\n", "\n" + prefix)
+        args = (text,)
+    with _print_lock:
+        print(*args, sep=sep, **kwargs)
@@ -0,0 +1,50 @@
+"""
+日付・時刻関連のユーティリティ
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict
+
+from botlib.config import BaseConfig
+
+
+class DateUtils:
+    """日付・時刻関連のユーティリティクラス"""
+    
+    @staticmethod
+    def get_today_jst() -> datetime:
+        """今日の日付（日本時間）を取得"""
+        return datetime.now(BaseConfig.JST)
+    
+    @staticmethod
+    def get_today_formatted() -> str:
+        """今日の日付を日本語形式で取得"""
+        return DateUtils.get_today_jst().strftime("%Y年%m月%d日")
+    
+    @staticmethod
+    def get_date_range(days: int = 7) -> Dict[str, datetime]:
+        """指定日数前からの日付範囲を取得"""
+        today = DateUtils.get_today_jst()
+        past_date = today - timedelta(days=days)
+        return {
+            "from_date": past_date,
+            "to_date": today
+        }
+    
+    @staticmethod
+    def get_date_range_hours(hours: int = 24) -> Dict[str, datetime]:
+        """指定時間前からの日付範囲を取得"""
+        now = DateUtils.get_today_jst()
+        past_time = now - timedelta(hours=hours)
+        return {
+            "from_date": past_time,
+            "to_date": now
+        }
+    
+    @staticmethod
+    def format_date_range(date_range: Dict[str, datetime], with_time: bool = False) -> str:
+        """日付範囲を文字列形式で取得（ログ表示用）"""
+        fmt = "%Y-%m-%d %H:%M" if with_time else "%Y-%m-%d"
+        from_str = date_range['from_date'].strftime(fmt)
+        to_str = date_range['to_date'].strftime(fmt)
+        return f"{from_str} 〜 {to_str}"
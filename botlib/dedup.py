@@ -0,0 +1,242 @@
+"""
+既出の話題の抑制（MinHash + LSH）
+配信した回答の段落を MinHash の署名にしてSQLiteに保存し、次回以降の配信で似た段落を省く。
+署名は帯（band）ごとのハッシュで索引を作るので、履歴が増えても候補だけを調べればよい。
+"""
+
+import hashlib
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from typing import List, Optional, Sequence, Tuple, Type
+
+from botlib.config import BaseConfig
+
+# 署名の長さ（ハッシュ関数の数）と、LSH の帯の分け方（帯の数 × 1帯の行数 = 署名の長さ）
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERMUTATIONS // LSH_BANDS
+
+# 文字 n-gram（日本語は単語で区切れないので文字単位）
+SHINGLE_SIZE = 4
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_random = random.Random(20240601)
+_PERMUTATIONS = [
+    (_random.randrange(1, _MERSENNE_PRIME), _random.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS paragraphs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    signature BLOB NOT NULL,
+    preview TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS bands (
+    band_key INTEGER NOT NULL,
+    paragraph_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS bands_key ON bands (band_key);
+CREATE INDEX IF NOT EXISTS bands_paragraph ON bands (paragraph_id);
+CREATE INDEX IF NOT EXISTS paragraphs_created ON paragraphs (created_at);
+"""
+
+
+def _normalize(text: str) -> str:
+    """表記ゆれ（全角・半角、空白、記号、絵文字）を除いた比較用の文字列"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return re.sub(r"[\W_]+", "", text)
+
+
+def _hash64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+def minhash(text: str) -> Tuple[int, ...]:
+    """段落の MinHash 署名"""
+    normalized = _normalize(text)
+    if len(normalized) <= SHINGLE_SIZE:
+        shingles = {normalized}
+    else:
+        shingles = {normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+    hashes = [_hash64(shingle.encode("utf-8")) for shingle in shingles]
+    return tuple(
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+        for a, b in _PERMUTATIONS
+    )
+
+
+def similarity(sig1: Sequence[int], sig2: Sequence[int]) -> float:
+    """2つの署名から推定した Jaccard 類似度"""
+    return sum(1 for x, y in zip(sig1, sig2) if x == y) / NUM_PERMUTATIONS
+
+
+def band_keys(signature: Sequence[int]) -> List[int]:
+    """LSH の帯ごとのキー（帯の番号も含めてハッシュする）"""
+    keys = []
+    for band in range(LSH_BANDS):
+        rows = array("I", signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]).tobytes()
+        # SQLite の INTEGER（符号付き64ビット）に収める
+        key = _hash64(bytes([band]) + rows)
+        keys.append(key - (1 << 64) if key >= (1 << 63) else key)
+    return keys
+
+
+def paragraph_title(paragraph: str, max_chars: int = 40) -> str:
+    """段落の1行目を短くしたもの（省略した話題の表示用）"""
+    line = paragraph.strip().splitlines()[0].replace("**", "").strip("#【】 ")
+    return line if len(line) <= max_chars else line[:max_chars - 1] + "…"
+
+
+class DuplicateIndex:
+    """配信済みの段落の MinHash 索引（SQLite）"""
+    
+    def __init__(self, config: Type[BaseConfig]):
+        self.config = config
+        self.path = os.path.join(config.STATE_DIR, "dedup", f"{config.BOT_ID}.sqlite3")
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+    
+    def _connect(self) -> sqlite3.Connection:
+        """接続を取得（初回にテーブルを作成）"""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+    
+    def find_similar(self, signature: Sequence[int]) -> Optional[str]:
+        """有効期限内に配信した、似た段落の先頭部分を返す（なければNone）"""
+        keys = band_keys(signature)
+        since = time.time() - self.config.DEDUP_WINDOW_SECONDS
+        placeholders = ",".join("?" * len(keys))
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT DISTINCT p.signature, p.preview FROM bands b JOIN paragraphs p ON p.id = b.paragraph_id "
+                f"WHERE b.band_key IN ({placeholders}) AND p.created_at >= ?",
+                (*keys, since)
+            ).fetchall()
+        for blob, preview in rows:
+            if similarity(signature, array("I", blob)) >= self.config.DEDUP_THRESHOLD:
+                return preview
+        return None
+    
+    def add(self, entries: List[Tuple[Sequence[int], str]]) -> None:
+        """配信した段落の署名を登録し、期限切れの署名を削除"""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                expired = now - self.config.DEDUP_WINDOW_SECONDS
+                conn.execute("DELETE FROM bands WHERE paragraph_id IN (SELECT id FROM paragraphs WHERE created_at < ?)",
+                             (expired,))
+                conn.execute("DELETE FROM paragraphs WHERE created_at < ?", (expired,))
+                for signature, preview in entries:
+                    cursor = conn.execute(
+                        "INSERT INTO paragraphs (created_at, signature, preview) VALUES (?, ?, ?)",
+                        (now, array("I", signature).tobytes(), preview)
+                    )
+                    conn.executemany(
+                        "INSERT INTO bands (band_key, paragraph_id) VALUES (?, ?)",
+                        [(key, cursor.lastrowid) for key in band_keys(signature)]
+                    )
+    
+    def close(self) -> None:
+        """接続を閉じる"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class DuplicateFilter:
+    """回答の段落のうち、最近配信した段落と似たものを省く・まとめるクラス
+
+    1回の配信の中（別の質問の回答どうし）で重複する段落も省く。
+    配信が完了したら commit() で今回送った段落を索引に登録する。
+    """
+    
+    def __init__(self, config: Type[BaseConfig], index: DuplicateIndex):
+        self.config = config
+        self.index = index
+        self._pending: List[Tuple[Tuple[int, ...], str]] = []
+    
+    def filter_answers(self, qa_pairs: List[Tuple[str, str]],
+                       continued: bool = False) -> Tuple[List[Tuple[str, str]], int]:
+        """既出の段落を省いた回答と、省いた段落の数を返す
+        
+        continued=True なら同じ配信の続きとして、前回の呼び出しで残した段落とも比べる（索引への登録もまとめて行う）。
+        """
+        if not continued:
+            self._pending = []
+        filtered = []
+        removed = 0
+        for question_display, answer in qa_pairs:
+            answer, count = self._filter_answer(answer)
+            filtered.append((question_display, answer))
+            removed += count
+        return filtered, removed
+    
+    def _filter_answer(self, answer: str) -> Tuple[str, int]:
+        """1件の回答から既出の段落を省く"""
+        paragraphs = [p for p in re.split(r"\n\s*\n", answer.strip()) if p.strip()]
+        kept: List[str] = []
+        skipped_titles: List[str] = []
+        removed = 0
+        kept_topics = 0
+        
+        def flush_skipped() -> None:
+            if skipped_titles and self.config.DEDUP_ACTION == "collapse":
+                kept.append("🔁 配信済みの話題のため省略: " + " / ".join(f"「{t}」" for t in skipped_titles))
+            skipped_titles.clear()
+        
+        for paragraph in paragraphs:
+            if len(_normalize(paragraph)) < self.config.DEDUP_MIN_CHARS:
+                flush_skipped()
+                kept.append(paragraph)
+                continue
+            
+            signature = minhash(paragraph)
+            duplicate = self.index.find_similar(signature) is not None or any(
+                similarity(signature, other) >= self.config.DEDUP_THRESHOLD for other, _ in self._pending
+            )
+            if duplicate:
+                removed += 1
+                skipped_titles.append(paragraph_title(paragraph))
+                continue
+            
+            flush_skipped()
+            kept.append(paragraph)
+            kept_topics += 1
+            self._pending.append((signature, paragraph_title(paragraph, 80)))
+        
+        flush_skipped()
+        if removed and kept_topics == 0:
+            kept.append("前回までの配信以降、新しい話題はありませんでした")
+        return "\n\n".join(kept), removed
+    
+    def commit(self) -> int:
+        """今回配信した段落を索引に登録（戻り値: 件数）"""
+        pending, self._pending = self._pending, []
+        if pending:
+            self.index.add(pending)
+        return len(pending)
+    
+    def register(self, qa_pairs: List[Tuple[str, str]]) -> int:
+        """配信済みの回答の段落をそのまま索引に登録（resume で再開した配信用）"""
+        self._pending = []
+        for _, answer in qa_pairs:
+            for paragraph in re.split(r"\n\s*\n", answer.strip()):
+                if len(_normalize(paragraph)) >= self.config.DEDUP_MIN_CHARS:
+                    self._pending.append((minhash(paragraph), paragraph_title(paragraph, 80)))
+        return self.commit()
@@ -0,0 +1,79 @@
+"""
+deferred（非同期）で投入した質問の記録
+--submit で投入した質問のリクエストIDをBotごとに保存し、run / prepare / deliver で回答を回収するときに使う
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional, Type
+
+from botlib.config import BaseConfig
+
+
+class DeferredRequests:
+    """質問（モデル・質問文）ごとに deferred のリクエストIDを保存するクラス"""
+    
+    def __init__(self, config: Type[BaseConfig]):
+        self.config = config
+        self.path = os.path.join(config.STATE_DIR, "deferred", f"{config.BOT_ID}.json")
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def make_key(question: str, model: str) -> str:
+        """モデル・質問文からキーを作成"""
+        material = json.dumps({"model": model, "question": question}, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+    
+    def _load(self) -> Dict[str, dict]:
+        """保存済みの記録を読み込む"""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                entries = json.load(f)
+            return entries if isinstance(entries, dict) else {}
+        except (OSError, ValueError):
+            return {}
+    
+    def _save(self, entries: Dict[str, dict]) -> None:
+        """記録を保存（一時ファイル経由で置き換える）"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+    
+    def _is_fresh(self, entry: dict) -> bool:
+        """回収に使える期限内かどうか"""
+        return time.time() - entry.get("submitted_at", 0) <= self.config.GROK_DEFERRED_MAX_AGE_SECONDS
+    
+    def add(self, question: str, model: str, request_id: str) -> None:
+        """投入した質問のリクエストIDを保存（期限切れの記録は削除）"""
+        with self._lock:
+            entries = {key: entry for key, entry in self._load().items() if self._is_fresh(entry)}
+            entries[self.make_key(question, model)] = {
+                "request_id": request_id,
+                "model": model,
+                "submitted_at": time.time(),
+            }
+            self._save(entries)
+    
+    def get(self, question: str, model: str) -> Optional[str]:
+        """期限内に投入した質問のリクエストID（なければNone。期限切れの記録は削除）"""
+        key = self.make_key(question, model)
+        with self._lock:
+            entries = self._load()
+            entry = entries.get(key)
+            if entry is not None and not self._is_fresh(entry):
+                del entries[key]
+                self._save(entries)
+                entry = None
+        return None if entry is None else entry["request_id"]
+    
+    def remove(self, question: str, model: str) -> None:
+        """回収した（または期限切れ・失敗で回収できなくなった）質問の記録を削除"""
+        with self._lock:
+            entries = self._load()
+            if entries.pop(self.make_key(question, model), None) is not None:
+                self._save(entries)
@@ -0,0 +1,142 @@
+"""
+差分配信（前回の配信以降の新しい動きだけを生成）
+質問ごとに前回配信した回答の要約（見出し・項目名）を保存し、次回の質問に添えて重複を省かせる
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Type
+
+from botlib.config import BaseConfig
+from botlib.dates import DateUtils
+
+# 要約に使う見出し・項目の行（【見出し】/ ■ / 1. / # など。**太字** で囲まれていてもよい）
+_HEADING_PATTERN = re.compile(r"^\s*(?:\*\*)?\s*(【.+】|[■□●◆◇▶▼★☆#]+\s*\S|[0-9０-９]+[.．)）、]\s*\S)")
+# 要約1行あたりの最大文字数
+_SUMMARY_LINE_MAX_CHARS = 80
+
+
+def summarize_answer(answer: str, max_chars: int) -> str:
+    """回答から見出し・項目名の行を抜き出して要約を作る（なければ各段落の1文目）"""
+    lines = [line.strip() for line in answer.splitlines() if _HEADING_PATTERN.match(line)]
+    if not lines:
+        lines = [
+            re.split(r"(?<=[。！？!?])", paragraph.strip(), maxsplit=1)[0]
+            for paragraph in answer.split("\n\n") if paragraph.strip()
+        ]
+    
+    summary: List[str] = []
+    total = 0
+    for line in lines:
+        line = line.replace("**", "").strip()
+        if len(line) > _SUMMARY_LINE_MAX_CHARS:
+            line = line[:_SUMMARY_LINE_MAX_CHARS - 1] + "…"
+        if total + len(line) + 1 > max_chars:
+            break
+        summary.append(line)
+        total += len(line) + 1
+    return "\n".join(summary)
+
+
+def _merge_summaries(new: str, old: str, max_chars: int) -> str:
+    """新しい要約を先頭に、前回までの要約を後ろに足して max_chars 以内に収める（行単位）"""
+    merged: List[str] = []
+    total = 0
+    for line in (new.splitlines() + old.splitlines()):
+        if not line or line in merged:
+            continue
+        if total + len(line) + 1 > max_chars:
+            break
+        merged.append(line)
+        total += len(line) + 1
+    return "\n".join(merged)
+
+
+class DigestState:
+    """質問ごとに前回配信した内容の要約を保存するクラス
+
+    生成した回答はいったん pending に置き、配信が完了したら delivered に移す（届いていない内容を既出扱いしない）。
+    """
+    
+    def __init__(self, config: Type[BaseConfig]):
+        self.config = config
+        self.path = os.path.join(config.STATE_DIR, "digest", f"{config.BOT_ID}.json")
+        self._lock = threading.Lock()
+    
+    def _load(self) -> Dict[str, Dict[str, dict]]:
+        """保存済みの状態を読み込む"""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        return {"delivered": state.get("delivered", {}), "pending": state.get("pending", {})}
+    
+    def _save(self, state: Dict[str, Dict[str, dict]]) -> None:
+        """状態を保存（一時ファイル経由で置き換える）"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+    
+    def previous(self, number: int) -> Optional[dict]:
+        """有効期限内の前回配信の要約（なければNone）"""
+        entry = self._load()["delivered"].get(str(number))
+        if not entry or not entry.get("summary"):
+            return None
+        if time.time() - entry.get("delivered_at", 0) > self.config.DIGEST_MAX_AGE_SECONDS:
+            return None
+        return entry
+    
+    def apply(self, number: int, question: str) -> str:
+        """前回配信の要約があれば、差分だけを生成させる指示を質問に付け足す（なければ質問そのまま）"""
+        entry = self.previous(number)
+        if entry is None:
+            return question
+        return f"""{question}
+
+前回（{entry['date']}）の配信では、以下の内容をお伝え済みです：
+{entry['summary']}
+
+上記と重複する内容は省き、前回の配信以降の新しい動きや続報だけを簡潔にまとめてください。
+新しい動きがなければ「前回の配信以降、大きな動きはありませんでした」と記載してください。"""
+    
+    def stage(self, answers: Dict[int, str]) -> None:
+        """生成した回答（質問番号 → 回答）の要約を配信待ちとして保存"""
+        if not answers:
+            return
+        with self._lock:
+            state = self._load()
+            for number, answer in answers.items():
+                state["pending"][str(number)] = {
+                    "summary": summarize_answer(answer, self.config.DIGEST_SUMMARY_MAX_CHARS),
+                    "generated_at": time.time(),
+                }
+            self._save(state)
+    
+    def commit(self) -> int:
+        """配信が完了した回答の要約を「前回配信した内容」として確定（戻り値: 件数）"""
+        with self._lock:
+            state = self._load()
+            pending = state["pending"]
+            if not pending:
+                return 0
+            
+            now = time.time()
+            for key, entry in pending.items():
+                previous = state["delivered"].get(key)
+                old_summary = ""
+                if previous and now - previous.get("delivered_at", 0) <= self.config.DIGEST_MAX_AGE_SECONDS:
+                    old_summary = previous.get("summary", "")
+                state["delivered"][key] = {
+                    "summary": _merge_summaries(entry["summary"], old_summary, self.config.DIGEST_SUMMARY_MAX_CHARS),
+                    "date": DateUtils.get_today_formatted(),
+                    "delivered_at": now,
+                }
+            state["pending"] = {}
+            self._save(state)
+            return len(pending)
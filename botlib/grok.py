@@ -0,0 +1,406 @@
+"""
+Grok API（xAI SDK）との通信
+"""
+
+import json
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Iterator, NamedTuple, Optional, Tuple, Type
+
+import xai_sdk
+from xai_sdk import Client
+from xai_sdk.chat import Response, user
+from xai_sdk.proto import chat_pb2, deferred_pb2
+from xai_sdk.tools import web_search, x_search
+
+from botlib.config import BaseConfig
+from botlib.console import get_log_prefix, safe_print, set_log_prefix
+from botlib.latency import LatencyTracker
+from botlib.ratelimit import backoff_delay
+
+
+class GrokClientManager:
+    """xAI Client をプロセス内で共有するクラス
+    
+    Client（gRPCチャネル）は APIキーごとに1回だけ生成し、全質問・全Botで再利用する。
+    キープアライブを有効にしてチャネルを温めておき、TLSハンドシェイクや認証のやり直しを避ける。
+    """
+    
+    _clients: Dict[str, Client] = {}
+    _lock = threading.Lock()
+    
+    @classmethod
+    def get_client(cls, config: Type[BaseConfig]) -> Tuple[Client, bool]:
+        """共有 Client を取得（2つ目の戻り値は今回新規作成したかどうか）"""
+        api_key = config.XAI_API_KEY or ""
+        with cls._lock:
+            client = cls._clients.get(api_key)
+            if client is not None:
+                return client, False
+            
+            keepalive_ms = config.GROK_KEEPALIVE_SECONDS * 1000
+            client = Client(
+                api_key=config.XAI_API_KEY,
+                # 打ち切った呼び出しがいつまでも残らないよう、gRPC 側にも制限時間を付ける
+                timeout=config.GROK_QUESTION_TIMEOUT_SECONDS,
+                channel_options=[
+                    ("grpc.keepalive_time_ms", keepalive_ms),
+                    ("grpc.keepalive_timeout_ms", 10000),
+                    ("grpc.keepalive_permit_without_calls", 1),
+                    ("grpc.http2.max_pings_without_data", 0),
+                ]
+            )
+            cls._clients[api_key] = client
+            return client, True
+    
+    @classmethod
+    def close_all(cls) -> None:
+        """共有 Client をすべて閉じる"""
+        with cls._lock:
+            for client in cls._clients.values():
+                close = getattr(client, "close", None)
+                if close:
+                    close()
+            cls._clients.clear()
+
+
+# deferred の投入と回収を別の実行に分けるのに使う SDK の内部 API を確認した xai-sdk の版
+# （インストール時はこの版に固定する。公開 API の chat.defer() は完了まで待ち続けるので使えない）
+XAI_SDK_DEFERRED_VERSION = "1.20.0"
+
+
+# リトライする gRPC のステータス
+TRANSIENT_GRPC_CODES = ("UNAVAILABLE", "RESOURCE_EXHAUSTED", "INTERNAL", "ABORTED", "UNKNOWN")
+
+
+def is_transient_error(error: Exception) -> bool:
+    """リトライで回復する見込みのあるエラーか"""
+    code = getattr(error, "code", None)
+    if callable(code):
+        try:
+            return getattr(code(), "name", "") in TRANSIENT_GRPC_CODES
+        except Exception:
+            return False
+    return isinstance(error, (ConnectionError, TimeoutError))
+
+
+class GrokUsage(NamedTuple):
+    """1回の回答で使ったトークン数と検索ツールの呼び出し回数"""
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    reasoning_tokens: int = 0
+    web_search_calls: int = 0
+    x_search_calls: int = 0
+    
+    @classmethod
+    def from_response(cls, response) -> "GrokUsage":
+        """SDK のレスポンスから使用量を取り出す（取れない項目は0）"""
+        usage = getattr(response, "usage", None)
+        tool_usage = getattr(response, "server_side_tool_usage", None) or {}
+        web_calls = sum(count for name, count in tool_usage.items() if "WEB_SEARCH" in str(name).upper())
+        x_calls = sum(count for name, count in tool_usage.items() if "X_SEARCH" in str(name).upper())
+        return cls(
+            prompt_tokens=int(getattr(usage, "prompt_tokens", 0) or 0),
+            completion_tokens=int(getattr(usage, "completion_tokens", 0) or 0),
+            reasoning_tokens=int(getattr(usage, "reasoning_tokens", 0) or 0),
+            web_search_calls=int(web_calls),
+            x_search_calls=int(x_calls),
+        )
+    
+    @classmethod
+    def total(cls, usages: Iterable["GrokUsage"]) -> "GrokUsage":
+        """複数の使用量を項目ごとに合計"""
+        return cls(*(sum(values) for values in zip(cls(), *usages)))
+
+
+class GrokAnswer(NamedTuple):
+    """Grokの回答と使用量"""
+    content: str
+    usage: GrokUsage
+
+
+class GrokStream:
+    """ストリーミングで生成される回答
+    
+    反復すると生成されたテキストを順次返す。最後まで読み終えると usage に使用量が入る
+    （使用量は最後のチャンクまで受け取った時点のレスポンスから取り出す）。
+    """
+    
+    def __init__(self, question: str, config: Type[BaseConfig]):
+        self.question = question
+        self.config = config
+        self.usage = GrokUsage()
+    
+    def __iter__(self) -> Iterator[str]:
+        """生成されたテキストを順次返す"""
+        try:
+            chat, created, setup_time = GrokAPI._create_chat(self.question, self.config)
+            
+            with GrokAPI._in_flight:
+                sample_start = time.perf_counter()
+                first_token_time = None
+                response = None
+                for response, chunk in chat.stream():
+                    if not chunk.content:
+                        continue
+                    if first_token_time is None:
+                        first_token_time = time.perf_counter() - sample_start
+                    yield chunk.content
+                sample_time = time.perf_counter() - sample_start
+            
+            if response is not None:
+                self.usage = GrokUsage.from_response(response)
+            
+            connection = "新規接続" if created else "接続再利用"
+            first_token_str = f"{first_token_time:.2f}秒" if first_token_time is not None else "-"
+            safe_print(f"⏱️ Grok {connection}（ストリーミング）: 接続準備 {setup_time:.3f}秒 / "
+                       f"最初のトークン {first_token_str} / 生成 {sample_time:.2f}秒")
+        
+        except Exception as e:
+            safe_print(f"Grok API エラー詳細: {e}")
+            safe_print(traceback.format_exc(), end="")
+            raise
+
+
+class DeferredFailedError(RuntimeError):
+    """deferred の生成が期限切れ・失敗で終わり、もう回答を回収できない"""
+
+
+class GrokAPI:
+    """Grok APIとの通信を管理するクラス"""
+    
+    # プロセス全体での同時問い合わせ数の上限
+    _in_flight = threading.BoundedSemaphore(BaseConfig.GROK_GLOBAL_MAX_IN_FLIGHT)
+    
+    # 制限時間付き呼び出し・ヘッジ用のスレッド（打ち切った呼び出しは gRPC のタイムアウトで終わる）
+    _attempt_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="grok-attempt")
+    
+    @staticmethod
+    def _create_chat(question: str, config: Type[BaseConfig], schema: Optional[dict] = None):
+        """Web検索 + X検索付きのチャットを作成（戻り値: チャット, 新規接続か, 準備時間）
+        
+        schema（JSON スキーマ）を渡すと、回答をその形式の JSON で返させる。
+        """
+        setup_start = time.perf_counter()
+        client, created = GrokClientManager.get_client(config)
+        date_range = config.get_search_date_range()
+        
+        options = {}
+        if schema is not None:
+            options["response_format"] = chat_pb2.ResponseFormat(
+                format_type=chat_pb2.FORMAT_TYPE_JSON_SCHEMA,
+                schema=json.dumps(schema, ensure_ascii=False)
+            )
+        
+        chat = client.chat.create(
+            model=config.GROK_MODEL,
+            tools=[
+                web_search(),
+                x_search(
+                    from_date=date_range["from_date"],
+                    to_date=date_range["to_date"]
+                )
+            ],
+            **options
+        )
+        chat.append(user(question))
+        return chat, created, time.perf_counter() - setup_start
+    
+    @staticmethod
+    def ask_with_search(question: str, config: Type[BaseConfig], schema: Optional[dict] = None) -> GrokAnswer:
+        """Web検索 + X検索付きでGrokに質問（schema を渡すと JSON で回答させる）"""
+        try:
+            chat, created, setup_time = GrokAPI._create_chat(question, config, schema)
+            
+            with GrokAPI._in_flight:
+                sample_start = time.perf_counter()
+                response = chat.sample()
+                sample_time = time.perf_counter() - sample_start
+            
+            connection = "新規接続" if created else "接続再利用"
+            safe_print(f"⏱️ Grok {connection}: 接続準備 {setup_time:.3f}秒 / 生成 {sample_time:.2f}秒")
+            
+            return GrokAnswer(response.content, GrokUsage.from_response(response))
+        
+        except Exception as e:
+            safe_print(f"Grok API エラー詳細: {e}")
+            safe_print(traceback.format_exc(), end="")
+            raise
+    
+    @staticmethod
+    def stream_with_search(question: str, config: Type[BaseConfig]) -> "GrokStream":
+        """Web検索 + X検索付きでGrokに質問し、生成されたテキストを順次返す（使用量は読み終えた後の usage）"""
+        return GrokStream(question, config)
+    
+    @staticmethod
+    def ask_with_deadline(question: str, config: Type[BaseConfig],
+                          tracker: Optional[LatencyTracker] = None, schema: Optional[dict] = None,
+                          on_late_usage: Optional[Callable[[GrokUsage], None]] = None) -> GrokAnswer:
+        """制限時間・リトライ・ヘッジ付きでGrokに質問
+        
+        GROK_QUESTION_TIMEOUT_SECONDS を過ぎたら TimeoutError を送出する。
+        schema（JSON スキーマ）を渡すと、回答をその形式の JSON で返させる。
+        打ち切った試行が後から完了したときは、その使用量で on_late_usage を呼ぶ。
+        """
+        deadline = time.monotonic() + config.GROK_QUESTION_TIMEOUT_SECONDS
+        attempt = 0
+        
+        while True:
+            try:
+                return GrokAPI._ask_hedged(question, config, deadline, tracker, schema, on_late_usage)
+            
+            except TimeoutError:
+                raise
+            
+            except Exception as e:
+                if attempt >= config.GROK_MAX_RETRIES or not is_transient_error(e):
+                    raise
+                delay = backoff_delay(attempt, config.GROK_RETRY_BASE_SECONDS, 30)
+                if time.monotonic() + delay >= deadline:
+                    raise
+                attempt += 1
+                safe_print(f"⏳ Grok 一時エラー: {delay:.1f}秒後にリトライ（{attempt}回目）")
+                time.sleep(delay)
+    
+    @staticmethod
+    def _ask_hedged(question: str, config: Type[BaseConfig], deadline: float,
+                    tracker: Optional[LatencyTracker], schema: Optional[dict] = None,
+                    on_late_usage: Optional[Callable[[GrokUsage], None]] = None) -> GrokAnswer:
+        """1回分の問い合わせ（p90 を超えたら同じ質問をもう1本投げ、早く返った方を使う）
+        
+        使用量は、回答を返す時点で完了している試行の分を合計する。まだ実行中の試行の使用量は、
+        完了したときに on_late_usage で通知する。
+        """
+        prefix = get_log_prefix()
+        
+        def attempt() -> Tuple[GrokAnswer, float]:
+            set_log_prefix(prefix)
+            start = time.monotonic()
+            answer = GrokAPI.ask_with_search(question, config, schema)
+            return answer, time.monotonic() - start
+        
+        hedge_after = None
+        if config.GROK_HEDGING and tracker is not None:
+            hedge_after = tracker.percentile(config.GROK_HEDGE_PERCENTILE, config.GROK_HEDGE_MIN_SAMPLES)
+        
+        pending = {GrokAPI._attempt_pool.submit(attempt)}
+        hedged = False
+        first_error: Optional[Exception] = None
+        start = time.monotonic()
+        
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            
+            timeout = remaining
+            if hedge_after is not None and not hedged:
+                timeout = min(remaining, max(0.0, start + hedge_after - time.monotonic()))
+            
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                error = future.exception()
+                if error is None:
+                    answer, elapsed = future.result()
+                    if tracker is not None:
+                        tracker.record(elapsed)
+                    # 回答は先に返った方を使うが、使用量は完了済みの試行すべての分を数える
+                    others = []
+                    for other in (done | pending) - {future}:
+                        if not other.done():
+                            GrokAPI._report_late_usage(other, on_late_usage)
+                        elif other.exception() is None:
+                            others.append(other.result()[0].usage)
+                    return answer._replace(usage=GrokUsage.total([answer.usage, *others]))
+                first_error = first_error or error
+            
+            if not done and hedge_after is not None and not hedged:
+                hedged = True
+                safe_print(f"🔀 Grok 回答が p{config.GROK_HEDGE_PERCENTILE}（{hedge_after:.1f}秒）を超えたため、"
+                           "同じ質問をもう1本送信")
+                pending.add(GrokAPI._attempt_pool.submit(attempt))
+        
+        if first_error is not None and not pending:
+            raise first_error
+        for future in pending:
+            GrokAPI._report_late_usage(future, on_late_usage)
+        raise TimeoutError(f"{config.GROK_QUESTION_TIMEOUT_SECONDS}秒以内に回答が得られませんでした")
+    
+    @staticmethod
+    def _report_late_usage(future, on_late_usage: Optional[Callable[[GrokUsage], None]]) -> None:
+        """打ち切った試行が後から完了したら、その使用量を on_late_usage に渡す"""
+        if on_late_usage is None:
+            return
+        
+        def report(done) -> None:
+            if done.exception() is None:
+                on_late_usage(done.result()[0].usage)
+        
+        future.add_done_callback(report)
+    
+    # ========================================
+    # deferred（非同期）生成
+    # ========================================
+    
+    @staticmethod
+    def submit_deferred(question: str, config: Type[BaseConfig], schema: Optional[dict] = None) -> str:
+        """Web検索 + X検索付きの質問を deferred で投入し、リクエストIDを返す（回答は待たない）
+        
+        SDK の chat.defer() は完了までポーリングし続けるので、投入と回収を別の実行に分けるために
+        deferred のエンドポイント（StartDeferredCompletion）を SDK の内部 API 経由で直接呼ぶ。
+        """
+        chat, _, _ = GrokAPI._create_chat(question, config, schema)
+        stub, make_request = GrokAPI._sdk_internals(chat, "_stub", "_make_request")
+        response = stub.StartDeferredCompletion(make_request(1))
+        return response.request_id
+    
+    @staticmethod
+    def get_deferred(request_id: str, config: Type[BaseConfig]) -> Optional[GrokAnswer]:
+        """deferred の回答を1回だけ確認（生成中ならNone。期限切れ・失敗なら DeferredFailedError）"""
+        client, _ = GrokClientManager.get_client(config)
+        stub, = GrokAPI._sdk_internals(client.chat, "_stub")
+        result = stub.GetDeferredCompletion(deferred_pb2.GetDeferredRequest(request_id=request_id))
+        if result.status == deferred_pb2.DeferredStatus.DONE:
+            response = Response(result.response, 0)
+            return GrokAnswer(response.content, GrokUsage.from_response(response))
+        if result.status == deferred_pb2.DeferredStatus.PENDING:
+            return None
+        status = deferred_pb2.DeferredStatus.Name(result.status)
+        raise DeferredFailedError(f"deferred の生成が完了しませんでした（{status}）")
+    
+    @staticmethod
+    def _sdk_internals(target, *names: str) -> list:
+        """deferred に使う SDK の内部 API を取得（SDK の更新で見つからなければ RuntimeError）"""
+        try:
+            return [getattr(target, name) for name in names]
+        except AttributeError as e:
+            version = getattr(xai_sdk, "__version__", "不明")
+            raise RuntimeError(f"xai-sdk {version} には deferred の投入・回収に使う API がありません"
+                               f"（xai-sdk=={XAI_SDK_DEFERRED_VERSION} をインストールしてください）: {e}") from e
+    
+    @staticmethod
+    def wait_deferred(request_id: str, config: Type[BaseConfig], timeout: float) -> GrokAnswer:
+        """deferred の回答が揃うまでバックオフ付きでポーリング（timeout 秒を過ぎたら TimeoutError）"""
+        deadline = time.monotonic() + timeout
+        attempt = 0
+        while True:
+            try:
+                answer = GrokAPI.get_deferred(request_id, config)
+            except RuntimeError:
+                raise
+            except Exception as e:
+                if not is_transient_error(e):
+                    raise
+                answer = None
+            if answer is not None:
+                return answer
+            
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"{timeout:.0f}秒以内に deferred の回答が揃いませんでした")
+            delay = max(config.GROK_DEFERRED_POLL_SECONDS,
+                        backoff_delay(attempt, config.GROK_DEFERRED_POLL_SECONDS, 30))
+            attempt += 1
+            time.sleep(min(delay, remaining))
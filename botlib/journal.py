@@ -0,0 +1,245 @@
+"""
+配信ジャーナル（SQLite）
+実行ごとの回答と、送信リクエスト（宛先 × メッセージのまとまり）ごとの送信状況を記録する。
+途中で落ちても resume モードで未送信分だけを同じ X-Line-Retry-Key で送り直せる。
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple, Type
+
+from botlib.config import BaseConfig
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    bot_id TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    qa_pairs TEXT NOT NULL,
+    batches TEXT NOT NULL,
+    completed_at REAL
+);
+CREATE TABLE IF NOT EXISTS requests (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL,
+    batch_index INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    recipients TEXT NOT NULL,
+    retry_key TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS requests_run_status ON requests (run_id, status, seq);
+CREATE INDEX IF NOT EXISTS requests_run_batch ON requests (run_id, batch_index, seq);
+"""
+
+
+class PlannedRequest(NamedTuple):
+    """送信予定のリクエスト1件"""
+    seq: int
+    batch_index: int
+    kind: str               # "push" / "multicast" / "broadcast" / "narrowcast"
+    recipients: List[str]
+    retry_key: str
+
+
+class DeliveryJournal:
+    """配信状況をSQLiteに記録するクラス
+
+    requests.status は pending（未送信）/ sent（送信済み）/ failed（失敗）/ replaced（push で再送済み）。
+    """
+    
+    # 送信待ちリクエストを読み出す単位（宛先が多くてもメモリに全件載せない）
+    # multicast は1件に最大500人の宛先を持つので、1回に読む件数は少なめにする
+    PAGE_SIZE = 20
+    
+    def __init__(self, config: Type[BaseConfig]):
+        self.config = config
+        self.path = os.path.join(config.STATE_DIR, "delivery_journal.sqlite3")
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+    
+    def _connect(self) -> sqlite3.Connection:
+        """接続を取得（初回にテーブルを作成）"""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+    
+    def start_run(self, qa_pairs: List[Tuple[str, str]], batches: List[List[str]]) -> str:
+        """実行を記録して run_id を返す（古い記録はここで削除）"""
+        run_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                expired = now - self.config.JOURNAL_RETENTION_SECONDS
+                conn.execute("DELETE FROM requests WHERE run_id IN (SELECT run_id FROM runs WHERE created_at < ?)",
+                             (expired,))
+                conn.execute("DELETE FROM runs WHERE created_at < ?", (expired,))
+                conn.execute(
+                    "INSERT INTO runs (run_id, bot_id, created_at, qa_pairs, batches) VALUES (?, ?, ?, ?, ?)",
+                    (run_id, self.config.BOT_ID, now,
+                     json.dumps(qa_pairs, ensure_ascii=False), json.dumps(batches, ensure_ascii=False))
+                )
+        return run_id
+    
+    def plan_requests(self, run_id: str, rows: Iterable[Tuple[int, str, List[str]]]) -> int:
+        """送信予定のリクエスト（batch_index, kind, 宛先）をまとめて登録し、件数を返す"""
+        now = time.time()
+        params = (
+            (run_id, batch_index, kind, json.dumps(recipients), str(uuid.uuid4()), now)
+            for batch_index, kind, recipients in rows
+        )
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                cursor = conn.executemany(
+                    "INSERT INTO requests (run_id, batch_index, kind, recipients, retry_key, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    params
+                )
+                return cursor.rowcount
+    
+    def extend_run(self, run_id: str, qa_pairs: List[Tuple[str, str]], batches: List[List[str]]) -> int:
+        """実行に回答とメッセージのまとまりを追加し、追加したまとまりの最初の batch_index を返す
+        
+        回答が届いた質問から順に配信する場合に、質問ごとに呼び出す。
+        """
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                row = conn.execute("SELECT qa_pairs, batches FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+                all_pairs = json.loads(row[0]) + [list(pair) for pair in qa_pairs]
+                all_batches = json.loads(row[1]) + batches
+                conn.execute(
+                    "UPDATE runs SET qa_pairs = ?, batches = ? WHERE run_id = ?",
+                    (json.dumps(all_pairs, ensure_ascii=False), json.dumps(all_batches, ensure_ascii=False), run_id)
+                )
+        return len(all_batches) - len(batches)
+    
+    def replace_request(self, run_id: str, request: PlannedRequest,
+                        rows: Iterable[Tuple[str, List[str]]]) -> List[PlannedRequest]:
+        """リクエストを、同じまとまりを送る別のリクエスト（kind, 宛先）に置き換える（multicast 失敗時の push 再送用）
+        
+        置き換え先の登録と元のリクエストの replaced への更新は1つのトランザクションで行うので、
+        途中で落ちても宛先が抜け落ちることはない（どちらも記録されていなければ元のリクエストが未送信のまま残る）。
+        """
+        now = time.time()
+        replacements = []
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                for kind, recipients in rows:
+                    retry_key = str(uuid.uuid4())
+                    cursor = conn.execute(
+                        "INSERT INTO requests (run_id, batch_index, kind, recipients, retry_key, updated_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (run_id, request.batch_index, kind, json.dumps(recipients), retry_key, now)
+                    )
+                    replacements.append(PlannedRequest(cursor.lastrowid, request.batch_index, kind, recipients,
+                                                       retry_key))
+                conn.execute("UPDATE requests SET status = 'replaced', updated_at = ? WHERE seq = ?",
+                             (now, request.seq))
+        return replacements
+    
+    def iter_pending(self, run_id: str, first_batch: int = 0) -> Iterator[PlannedRequest]:
+        """未送信・失敗したリクエストをまとまり順（同じまとまりの中は登録順）に返す
+        
+        呼び出し時点で登録済みの、first_batch 以降のまとまりだけを返す。push の再送は元の multicast より
+        後に登録されるが、まとまり順に返すので、--resume でも宛先ごとの順番は変わらない。
+        """
+        with self._lock:
+            row = self._connect().execute("SELECT MAX(seq) FROM requests WHERE run_id = ?", (run_id,)).fetchone()
+        max_seq = row[0] or 0
+        last = (first_batch, 0)
+        
+        while True:
+            with self._lock:
+                rows = self._connect().execute(
+                    "SELECT seq, batch_index, kind, recipients, retry_key FROM requests "
+                    "WHERE run_id = ? AND status IN ('pending', 'failed') AND seq <= ? "
+                    "AND (batch_index > ? OR (batch_index = ? AND seq > ?)) "
+                    "ORDER BY batch_index, seq LIMIT ?",
+                    (run_id, max_seq, last[0], last[0], last[1], self.PAGE_SIZE)
+                ).fetchall()
+            if not rows:
+                return
+            for seq, batch_index, kind, recipients, retry_key in rows:
+                yield PlannedRequest(seq, batch_index, kind, json.loads(recipients), retry_key)
+            last = (rows[-1][1], rows[-1][0])
+    
+    def unsent_before(self, run_id: str, batch_index: int) -> List[PlannedRequest]:
+        """batch_index より前のまとまりで、未送信・失敗のまま残っているリクエスト"""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT seq, batch_index, kind, recipients, retry_key FROM requests "
+                "WHERE run_id = ? AND status IN ('pending', 'failed') AND batch_index < ? ORDER BY batch_index, seq",
+                (run_id, batch_index)
+            ).fetchall()
+        return [PlannedRequest(seq, index, kind, json.loads(recipients), retry_key)
+                for seq, index, kind, recipients, retry_key in rows]
+    
+    def mark(self, seq: int, status: str) -> None:
+        """リクエストの送信状況を更新"""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("UPDATE requests SET status = ?, updated_at = ? WHERE seq = ?",
+                             (status, time.time(), seq))
+    
+    def renew_retry_key(self, seq: int) -> None:
+        """リクエストのリトライキーを新しくする（LINE 側で受付後に失敗したリクエストを送り直すため）"""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("UPDATE requests SET retry_key = ?, updated_at = ? WHERE seq = ?",
+                             (str(uuid.uuid4()), time.time(), seq))
+    
+    def count_unsent(self, run_id: str) -> int:
+        """未送信・失敗のリクエスト数"""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT COUNT(*) FROM requests WHERE run_id = ? AND status IN ('pending', 'failed')", (run_id,)
+            ).fetchone()
+        return row[0]
+    
+    def complete_run(self, run_id: str) -> None:
+        """実行を完了として記録"""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("UPDATE runs SET completed_at = ? WHERE run_id = ?", (time.time(), run_id))
+    
+    def find_incomplete_run(self) -> Optional[Tuple[str, List[Tuple[str, str]], List[List[str]]]]:
+        """再開できる直近の未完了の実行（run_id, qa_pairs, batches）を取得
+
+        X-Line-Retry-Key の有効期限（24時間）内のものだけを対象にする。
+        """
+        since = time.time() - self.config.JOURNAL_RESUME_MAX_AGE_SECONDS
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT run_id, qa_pairs, batches FROM runs "
+                "WHERE bot_id = ? AND completed_at IS NULL AND created_at >= ? "
+                "ORDER BY created_at DESC LIMIT 1",
+                (self.config.BOT_ID, since)
+            ).fetchone()
+        if row is None:
+            return None
+        run_id, qa_pairs, batches = row
+        return run_id, [tuple(pair) for pair in json.loads(qa_pairs)], json.loads(batches)
+    
+    def close(self) -> None:
+        """接続を閉じる"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
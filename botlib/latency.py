@@ -0,0 +1,56 @@
+"""
+Grok回答時間の履歴
+ヘッジ（遅いリクエストの二重発行）の判断に使うため、直近の回答時間をBotごとに保存する
+"""
+
+import json
+import math
+import os
+import threading
+from typing import List, Optional, Type
+
+from botlib.config import BaseConfig
+
+
+class LatencyTracker:
+    """直近の回答時間を保存し、パーセンタイルを計算するクラス"""
+    
+    # 保存する直近のサンプル数
+    MAX_SAMPLES = 100
+    
+    def __init__(self, config: Type[BaseConfig]):
+        self.path = os.path.join(config.STATE_DIR, "grok_latency", f"{config.BOT_ID}.json")
+        self._lock = threading.Lock()
+        self._samples: List[float] = self._load()
+    
+    def _load(self) -> List[float]:
+        """保存済みの回答時間を読み込む"""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return [float(v) for v in json.load(f)][-self.MAX_SAMPLES:]
+        except (OSError, ValueError, TypeError):
+            return []
+    
+    def record(self, seconds: float) -> None:
+        """回答時間を記録して保存"""
+        with self._lock:
+            self._samples = (self._samples + [seconds])[-self.MAX_SAMPLES:]
+            samples = list(self._samples)
+        
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(samples, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+    
+    def percentile(self, percent: float, min_samples: int) -> Optional[float]:
+        """回答時間のパーセンタイル（サンプルが min_samples 未満ならNone）"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < max(1, min_samples):
+            return None
+        index = min(len(samples) - 1, max(0, math.ceil(percent / 100 * len(samples)) - 1))
+        return samples[index]
@@ -0,0 +1,107 @@
+"""
+Grok利用量の台帳
+質問ごとのトークン数・検索回数をBotごと・日ごと（JST）に集計して保存し、1日の予算に対する利用額を判定する
+"""
+
+import json
+import os
+import threading
+from typing import Dict, Type
+
+from botlib.config import BaseConfig
+from botlib.dates import DateUtils
+from botlib.grok import GrokUsage
+
+# 予算の状態
+BUDGET_OK = "ok"
+BUDGET_SOFT_LIMIT = "soft_limit"    # GROK_BUDGET_SOFT_RATIO 以上: 任意の質問を軽いモデルで生成
+BUDGET_EXCEEDED = "exceeded"        # 予算以上: 任意の質問は省略し、必須の質問を軽いモデルで生成
+
+
+class UsageLedger:
+    """Grokの利用量と概算の利用額（USD）を日ごとに記録するクラス"""
+    
+    # 保存しておく日数
+    MAX_DAYS = 90
+    
+    def __init__(self, config: Type[BaseConfig]):
+        self.config = config
+        self.path = os.path.join(config.STATE_DIR, "usage_ledger", f"{config.BOT_ID}.json")
+        self._lock = threading.Lock()
+        self._days: Dict[str, dict] = self._load()
+    
+    def _load(self) -> Dict[str, dict]:
+        """保存済みの台帳を読み込む"""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                days = json.load(f)
+            return days if isinstance(days, dict) else {}
+        except (OSError, ValueError):
+            return {}
+    
+    def _save(self, days: Dict[str, dict]) -> None:
+        """台帳を保存（一時ファイル経由で置き換える）"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(days, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+    
+    @staticmethod
+    def _today() -> str:
+        return DateUtils.get_today_jst().strftime("%Y-%m-%d")
+    
+    def estimate_cost(self, usage: GrokUsage) -> float:
+        """使用量から概算の利用額（USD）を計算（推論トークンは出力として計算）"""
+        config = self.config
+        return (
+            usage.prompt_tokens * config.GROK_PRICE_INPUT_PER_MTOK / 1_000_000
+            + (usage.completion_tokens + usage.reasoning_tokens) * config.GROK_PRICE_OUTPUT_PER_MTOK / 1_000_000
+            + (usage.web_search_calls + usage.x_search_calls) * config.GROK_PRICE_PER_1K_SEARCH_CALLS / 1000
+        )
+    
+    def record(self, usage: GrokUsage, model: str, questions: int = 1) -> float:
+        """1回分の使用量を今日の集計に加えて保存し、今回の利用額を返す
+        
+        questions はこの回答で答えた質問数（ヘッジで後から返った試行など、記録済みの質問の追加分は0）。
+        """
+        cost = self.estimate_cost(usage)
+        today = self._today()
+        with self._lock:
+            day = self._days.setdefault(today, {"questions": 0, "cost_usd": 0.0, "models": {}})
+            day["questions"] += questions
+            for field, value in usage._asdict().items():
+                day[field] = day.get(field, 0) + value
+            day["cost_usd"] = round(day["cost_usd"] + cost, 6)
+            day["models"][model] = day["models"].get(model, 0) + 1
+            
+            for old in sorted(self._days)[:-self.MAX_DAYS]:
+                del self._days[old]
+            days = json.loads(json.dumps(self._days))
+        
+        try:
+            self._save(days)
+        except OSError:
+            pass
+        return cost
+    
+    def today(self) -> dict:
+        """今日の集計"""
+        with self._lock:
+            return dict(self._days.get(self._today(), {}))
+    
+    def spent_today(self) -> float:
+        """今日の概算利用額（USD）"""
+        return self.today().get("cost_usd", 0.0)
+    
+    def budget_status(self) -> str:
+        """1日の予算に対する状態（予算が未設定なら常に BUDGET_OK）"""
+        budget = self.config.GROK_DAILY_BUDGET_USD
+        if budget <= 0:
+            return BUDGET_OK
+        spent = self.spent_today()
+        if spent >= budget:
+            return BUDGET_EXCEEDED
+        if spent >= budget * self.config.GROK_BUDGET_SOFT_RATIO:
+            return BUDGET_SOFT_LIMIT
+        return BUDGET_OK
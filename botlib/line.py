@@ -0,0 +1,307 @@
+"""
+LINE Messaging APIとの通信
+"""
+
+import json
+import threading
+import time
+import uuid
+from typing import Dict, List, NamedTuple, Optional, Tuple, Type, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from botlib.config import BaseConfig
+from botlib.console import safe_print
+from botlib.metrics import record_line_request
+from botlib.ratelimit import TokenBucket, backoff_delay, parse_retry_after
+
+
+class EncodedMessages(NamedTuple):
+    """1リクエスト分のメッセージを JSON にエンコードしたもの（宛先を除いた本文の後半）"""
+    tail: bytes         # b'"messages":[...]}'
+    count: int          # メッセージ数
+
+
+class NarrowcastError(RuntimeError):
+    """narrowcast が LINE 側で失敗した、または待機時間内に完了しなかった"""
+    
+    def __init__(self, message: str, request_id: str, phase: str):
+        super().__init__(message)
+        self.request_id = request_id
+        self.phase = phase
+    
+    @property
+    def failed(self) -> bool:
+        """LINE 側で失敗した（同じリトライキーで送り直しても受付済みとして扱われるので、キーを変えて再送する）"""
+        return self.phase == "failed"
+
+
+class LineAPI:
+    """LINE Messaging APIとの通信を管理するクラス
+    
+    チャネルアクセストークンごとにインスタンスを作り、keep-alive の requests.Session を使い回す。
+    同じトークンを使うBotが同じプロセスにいる場合は for_token() で同じインスタンスを共有する。
+    """
+    
+    _instances: Dict[str, "LineAPI"] = {}
+    _instances_lock = threading.Lock()
+    
+    PUSH_URL = "https://api.line.me/v2/bot/message/push"
+    MULTICAST_URL = "https://api.line.me/v2/bot/message/multicast"
+    BROADCAST_URL = "https://api.line.me/v2/bot/message/broadcast"
+    NARROWCAST_URL = "https://api.line.me/v2/bot/message/narrowcast"
+    NARROWCAST_PROGRESS_URL = "https://api.line.me/v2/bot/message/progress/narrowcast"
+    
+    # multicast 1リクエストあたりの最大宛先数
+    MULTICAST_MAX_RECIPIENTS = 500
+    
+    # 1リクエストで送れるメッセージオブジェクトの最大数
+    MAX_MESSAGES_PER_REQUEST = 5
+    
+    # リトライする HTTP ステータス
+    RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+    
+    # narrowcast の処理が終わった状態（progress の phase）
+    NARROWCAST_DONE_PHASES = ("succeeded", "failed")
+    
+    def __init__(self, access_token: str, config: Type[BaseConfig] = BaseConfig):
+        self.timeout: Tuple[int, int] = (config.LINE_CONNECT_TIMEOUT, config.LINE_READ_TIMEOUT)
+        self.retry_base = config.LINE_RETRY_BASE_SECONDS
+        self.retry_max = config.LINE_RETRY_MAX_SECONDS
+        
+        # エンドポイントごとのレート制限（インスタンスはトークンごとなので、トークン単位で効く）
+        self._buckets = {
+            LineAPI.PUSH_URL: TokenBucket(config.LINE_PUSH_RATE_PER_SECOND),
+            LineAPI.MULTICAST_URL: TokenBucket(config.LINE_MULTICAST_RATE_PER_SECOND),
+            # broadcast / narrowcast は1時間あたりの上限なので、1時間分までまとめて送れるようにする
+            LineAPI.BROADCAST_URL: TokenBucket(config.LINE_BROADCAST_RATE_PER_HOUR / 3600,
+                                               config.LINE_BROADCAST_RATE_PER_HOUR),
+            LineAPI.NARROWCAST_URL: TokenBucket(config.LINE_BROADCAST_RATE_PER_HOUR / 3600,
+                                                config.LINE_BROADCAST_RATE_PER_HOUR),
+        }
+        
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(config.LINE_POOL_SIZE, config.LINE_MAX_IN_FLIGHT))
+        self.session.mount("https://", adapter)
+        # 認証ヘッダーは生成時に1回だけ作る
+        self.session.headers.update({
+            "Authorization": f"Bearer {access_token}",
+            "Content-Type": "application/json"
+        })
+        
+        # 送信時間の計測用カウンタ
+        self._stats_lock = threading.Lock()
+        self.request_count = 0
+        self.first_request_time = 0.0
+        self.total_request_time = 0.0
+        self.retry_count = 0
+        self.throttled_time = 0.0
+    
+    @classmethod
+    def for_token(cls, access_token: str, config: Type[BaseConfig] = BaseConfig) -> "LineAPI":
+        """トークンごとに共有される LineAPI を取得"""
+        key = access_token or ""
+        with cls._instances_lock:
+            instance = cls._instances.get(key)
+            if instance is None:
+                instance = cls(access_token, config)
+                cls._instances[key] = instance
+            return instance
+    
+    @classmethod
+    def close_all(cls) -> None:
+        """共有している LineAPI のセッションをすべて閉じる"""
+        with cls._instances_lock:
+            for instance in cls._instances.values():
+                instance.close()
+            cls._instances.clear()
+    
+    def close(self) -> None:
+        """セッションを閉じる"""
+        self.session.close()
+    
+    @staticmethod
+    def _text_messages(messages: List[str]) -> List[dict]:
+        """テキストのリストをメッセージオブジェクトに変換"""
+        if len(messages) > LineAPI.MAX_MESSAGES_PER_REQUEST:
+            raise ValueError(f"1リクエストのメッセージは{LineAPI.MAX_MESSAGES_PER_REQUEST}件までです: {len(messages)}件")
+        return [{"type": "text", "text": message} for message in messages]
+    
+    @staticmethod
+    def encode_messages(messages: List[str]) -> EncodedMessages:
+        """メッセージ（最大5件）を JSON にエンコード（1回の配信で1回だけ行い、宛先だけを差し込んで使い回す）"""
+        data = json.dumps({"messages": LineAPI._text_messages(messages)}, ensure_ascii=False, separators=(",", ":"))
+        return EncodedMessages(data[1:].encode("utf-8"), len(messages))
+    
+    @staticmethod
+    def _encoded(messages: Union[List[str], EncodedMessages]) -> EncodedMessages:
+        """エンコード済みでなければエンコードする"""
+        return messages if isinstance(messages, EncodedMessages) else LineAPI.encode_messages(messages)
+    
+    @staticmethod
+    def build_body(to: Union[str, List[str], None], encoded: EncodedMessages) -> bytes:
+        """エンコード済みのメッセージに宛先を差し込んだリクエスト本文（to が None なら宛先なし）"""
+        if to is None:
+            return b"{" + encoded.tail
+        return b'{"to":' + json.dumps(to, separators=(",", ":")).encode("ascii") + b"," + encoded.tail
+    
+    @staticmethod
+    def build_narrowcast_body(audience_group_id: str, encoded: EncodedMessages) -> bytes:
+        """エンコード済みのメッセージにオーディエンスの指定を差し込んだ narrowcast のリクエスト本文"""
+        recipient = {"type": "audience", "audienceGroupId": int(audience_group_id)}
+        return b'{"recipient":' + json.dumps(recipient, separators=(",", ":")).encode("ascii") + b"," + encoded.tail
+    
+    def _post(self, url: str, body: bytes, retry_key: Optional[str] = None) -> requests.Response:
+        """POSTリクエストを送信（レート制限・429/5xx のリトライ付き）
+        
+        リトライでも同じ X-Line-Retry-Key を送るので、LINE側で受付済みなら二重送信されない（409が返る）。
+        """
+        headers = {"X-Line-Retry-Key": retry_key or str(uuid.uuid4())}
+        bucket = self._buckets.get(url)
+        deadline = time.monotonic() + self.retry_max
+        attempt = 0
+        
+        while True:
+            if bucket:
+                waited = bucket.acquire()
+                if waited:
+                    with self._stats_lock:
+                        self.throttled_time += waited
+            
+            try:
+                response = self._send(url, body, headers)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                response, error = None, e
+            else:
+                if response.status_code == 409 and response.headers.get("x-line-accepted-request-id"):
+                    # 同じリトライキーのリクエストが受付済み（前回送れていた）
+                    return response
+                if response.status_code not in LineAPI.RETRY_STATUS_CODES:
+                    response.raise_for_status()
+                    return response
+                error = None
+            
+            # リトライするか判断（Retry-After があれば優先し、なければジッター付き指数バックオフ）
+            retry_after = parse_retry_after(response.headers.get("Retry-After")) if response is not None else 0.0
+            delay = retry_after or backoff_delay(attempt, self.retry_base, 30)
+            if time.monotonic() + delay > deadline:
+                if response is not None:
+                    response.raise_for_status()
+                raise error
+            
+            if response is not None and response.status_code == 429 and bucket:
+                # 同じトークンの他の送信もまとめて待たせる
+                bucket.pause(delay)
+            
+            reason = response.status_code if response is not None else type(error).__name__
+            safe_print(f"⏳ LINE API {reason}: {delay:.1f}秒後にリトライ（{attempt + 1}回目）")
+            with self._stats_lock:
+                self.retry_count += 1
+            time.sleep(delay)
+            attempt += 1
+    
+    def _send(self, url: str, body: bytes, headers: dict) -> requests.Response:
+        """1回分のPOSTを送信して所要時間を記録"""
+        start = time.perf_counter()
+        try:
+            response = self.session.post(url, data=body, headers=headers, timeout=self.timeout)
+        except (requests.ConnectionError, requests.Timeout):
+            record_line_request(url, "error", time.perf_counter() - start)
+            raise
+        elapsed = time.perf_counter() - start
+        record_line_request(url, response.status_code, elapsed)
+        
+        with self._stats_lock:
+            if self.request_count == 0:
+                self.first_request_time = elapsed
+            self.request_count += 1
+            self.total_request_time += elapsed
+        
+        return response
+    
+    def send_messages(self, user_id: str, messages: Union[List[str], EncodedMessages],
+                      retry_key: Optional[str] = None) -> int:
+        """指定ユーザーにメッセージ（最大5件）を1リクエストで送信（messages はエンコード済みでもよい）"""
+        body = LineAPI.build_body(user_id, LineAPI._encoded(messages))
+        response = self._post(LineAPI.PUSH_URL, body, retry_key)
+        return response.status_code
+    
+    def multicast_messages(self, user_ids: List[str], messages: Union[List[str], EncodedMessages],
+                           retry_key: Optional[str] = None) -> int:
+        """複数ユーザー（最大500人）に同じメッセージ（最大5件）を1リクエストで送信（messages はエンコード済みでもよい）"""
+        if len(user_ids) > LineAPI.MULTICAST_MAX_RECIPIENTS:
+            raise ValueError(f"multicast の宛先は{LineAPI.MULTICAST_MAX_RECIPIENTS}人までです: {len(user_ids)}人")
+        
+        body = LineAPI.build_body(user_ids, LineAPI._encoded(messages))
+        response = self._post(LineAPI.MULTICAST_URL, body, retry_key)
+        return response.status_code
+    
+    def broadcast_messages(self, messages: Union[List[str], EncodedMessages], retry_key: Optional[str] = None) -> int:
+        """チャネルの友だち全員に同じメッセージ（最大5件）を1リクエストで送信"""
+        body = LineAPI.build_body(None, LineAPI._encoded(messages))
+        response = self._post(LineAPI.BROADCAST_URL, body, retry_key)
+        return response.status_code
+    
+    def narrowcast_messages(self, audience_group_id: Optional[str], messages: Union[List[str], EncodedMessages],
+                            retry_key: Optional[str] = None) -> str:
+        """オーディエンスに同じメッセージ（最大5件）を1リクエストで送信し、進捗の確認に使うリクエストIDを返す
+        
+        送信は LINE 側で非同期に行われるので、届いたかどうかは wait_narrowcast() で確認する。
+        """
+        if not audience_group_id:
+            raise ValueError("narrowcast にはオーディエンスID（LINE_AUDIENCE_GROUP_ID）が必要です")
+        
+        body = LineAPI.build_narrowcast_body(audience_group_id, LineAPI._encoded(messages))
+        response = self._post(LineAPI.NARROWCAST_URL, body, retry_key)
+        # 同じリトライキーで受付済みだった場合は、最初に受け付けたリクエストのIDが返る
+        return response.headers.get("x-line-accepted-request-id") or response.headers.get("x-line-request-id", "")
+    
+    def get_narrowcast_progress(self, request_id: str) -> dict:
+        """narrowcast の進捗（phase / successCount / failureCount / acceptedTime / completedTime など）を取得"""
+        response = self.session.get(LineAPI.NARROWCAST_PROGRESS_URL, params={"requestId": request_id},
+                                    timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+    
+    def wait_narrowcast(self, request_id: str, timeout: float, interval: float) -> dict:
+        """narrowcast の送信が終わるまで進捗を確認し、最後に取得した進捗を返す（timeout 秒で打ち切り）"""
+        deadline = time.monotonic() + timeout
+        while True:
+            progress = self.get_narrowcast_progress(request_id)
+            if progress.get("phase") in LineAPI.NARROWCAST_DONE_PHASES:
+                return progress
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return progress
+            time.sleep(min(interval, remaining))
+    
+    def timing_summary(self) -> str:
+        """送信時間の集計を文字列で取得（ログ表示用）"""
+        with self._stats_lock:
+            count = self.request_count
+            first = self.first_request_time
+            total = self.total_request_time
+            retries = self.retry_count
+            throttled = self.throttled_time
+        
+        if count == 0:
+            return "LINE送信なし"
+        if count == 1:
+            summary = f"LINE送信 1回: {first:.3f}秒"
+        else:
+            rest_avg = (total - first) / (count - 1)
+            summary = f"LINE送信 {count}回: 初回 {first:.3f}秒 / 2回目以降 平均 {rest_avg:.3f}秒"
+        if retries or throttled:
+            summary += f" / リトライ {retries}回 / レート制限待ち {throttled:.1f}秒"
+        return summary
+    
+    @staticmethod
+    def chunk_user_ids(user_ids: List[str], size: int = MULTICAST_MAX_RECIPIENTS) -> List[List[str]]:
+        """User IDのリストを multicast 用に分割"""
+        return [user_ids[i:i + size] for i in range(0, len(user_ids), size)]
+    
+    @staticmethod
+    def pack_messages(messages: List[str], size: int = MAX_MESSAGES_PER_REQUEST) -> List[List[str]]:
+        """メッセージを順序を保って1リクエスト分（最大5件）ずつにまとめる"""
+        return [messages[i:i + size] for i in range(0, len(messages), size)]
@@ -0,0 +1,205 @@
+"""
+実行ごとのメトリクス
+質問ごとのGrok回答時間・回答文字数・トークン数・検索回数、LINEリクエストの所要時間とステータス、
+実行全体の時間を集計し、実行終了時に Prometheus のテキストファイルと JSON Lines に書き出す。
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Type
+
+from botlib.config import BaseConfig
+
+# Prometheus のメトリクス名の接頭辞
+METRIC_PREFIX = "grok_line_bot"
+
+# 質問ごとに記録する使用量（GrokUsage の項目）
+USAGE_FIELDS = ("prompt_tokens", "completion_tokens", "reasoning_tokens", "web_search_calls", "x_search_calls")
+
+_local = threading.local()
+
+
+def set_current_metrics(metrics: Optional["RunMetrics"]) -> None:
+    """現在のスレッドで記録先にするメトリクスを設定"""
+    _local.metrics = metrics
+
+
+def get_current_metrics() -> Optional["RunMetrics"]:
+    """現在のスレッドの記録先メトリクスを取得"""
+    return getattr(_local, "metrics", None)
+
+
+def record_line_request(url: str, status, seconds: float) -> None:
+    """LINEリクエスト1回分を現在のスレッドのメトリクスに記録（未設定なら何もしない）"""
+    metrics = get_current_metrics()
+    if metrics is not None:
+        metrics.record_line_request(url.rsplit("/", 1)[-1], status, seconds)
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    """パーセンタイル（最近傍順位法）"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _labels(**labels) -> str:
+    """Prometheus のラベル表記"""
+    body = ",".join(f'{name}="{str(value)}"' for name, value in labels.items())
+    return "{" + body + "}"
+
+
+class RunMetrics:
+    """1回の実行のメトリクスを集計するクラス"""
+    
+    def __init__(self, config: Type[BaseConfig], mode: str = "run"):
+        self.config = config
+        self.mode = mode
+        self.directory = config.METRICS_DIR or os.path.join(config.STATE_DIR, "metrics")
+        self._lock = threading.Lock()
+        self._started_at = time.time()
+        self._start = time.perf_counter()
+        self.questions: Dict[int, dict] = {}
+        self.line_latencies: Dict[str, List[float]] = {}
+        self.line_status_counts: Dict[str, Dict[str, int]] = {}
+        self.delivery = {"requests": 0, "seconds": 0.0, "max_in_flight": 0}
+        self.total_seconds: Optional[float] = None
+    
+    def record_question(self, index: int, status: str, seconds: float, answer_chars: int = 0,
+                        usage: Optional[NamedTuple] = None) -> None:
+        """質問1件分の結果を記録（status: "ok" / "cache" / "error"、usage は GrokUsage）"""
+        entry = {
+            "index": index,
+            "status": status,
+            "seconds": round(seconds, 3),
+            "answer_chars": answer_chars,
+        }
+        entry.update(dict.fromkeys(USAGE_FIELDS, 0))
+        if usage is not None:
+            entry.update(usage._asdict())
+        with self._lock:
+            self.questions[index] = entry
+    
+    def record_line_request(self, endpoint: str, status, seconds: float) -> None:
+        """LINEリクエスト1回分（リトライも1回と数える）を記録"""
+        with self._lock:
+            self.line_latencies.setdefault(endpoint, []).append(seconds)
+            counts = self.line_status_counts.setdefault(endpoint, {})
+            counts[str(status)] = counts.get(str(status), 0) + 1
+    
+    def record_delivery(self, requests: int, seconds: float, max_in_flight: int) -> None:
+        """送信予定のリクエストを送り終えるまでの件数・時間を記録（生成しながら配信する場合は質問ごとに合算）"""
+        with self._lock:
+            self.delivery["requests"] += requests
+            self.delivery["seconds"] += seconds
+            self.delivery["max_in_flight"] = max_in_flight
+    
+    def _delivery_rate(self) -> float:
+        """達成した送信レート（リクエスト/秒）"""
+        seconds = self.delivery["seconds"]
+        return round(self.delivery["requests"] / seconds, 1) if seconds > 0 else 0.0
+    
+    def finish(self) -> None:
+        """実行時間を確定"""
+        self.total_seconds = time.perf_counter() - self._start
+    
+    def to_dict(self) -> dict:
+        """JSON Lines に書き出す1行分"""
+        with self._lock:
+            line = {}
+            for endpoint, latencies in self.line_latencies.items():
+                line[endpoint] = {
+                    "requests": len(latencies),
+                    "status_counts": dict(self.line_status_counts.get(endpoint, {})),
+                    "total_seconds": round(sum(latencies), 3),
+                    "p50_seconds": round(_percentile(latencies, 50), 4),
+                    "p90_seconds": round(_percentile(latencies, 90), 4),
+                    "max_seconds": round(max(latencies), 4),
+                }
+            return {
+                "bot": self.config.BOT_ID,
+                "mode": self.mode,
+                "started_at": datetime.fromtimestamp(self._started_at, self.config.JST).isoformat(timespec="seconds"),
+                "total_seconds": round(self.total_seconds or 0.0, 3),
+                "questions": [self.questions[index] for index in sorted(self.questions)],
+                "line": line,
+                "delivery": {
+                    "requests": self.delivery["requests"],
+                    "seconds": round(self.delivery["seconds"], 3),
+                    "requests_per_second": self._delivery_rate(),
+                    "max_in_flight": self.delivery["max_in_flight"],
+                },
+            }
+    
+    def to_prometheus(self) -> str:
+        """Prometheus のテキスト形式（node_exporter の textfile collector 用。全系列に bot・mode のラベルを付ける）"""
+        bot = self.config.BOT_ID
+        lines: List[str] = []
+        
+        def metric(name: str, kind: str, help_text: str, samples: List[tuple]) -> None:
+            if not samples:
+                return
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} {kind}")
+            for suffix, labels, value in samples:
+                lines.append(f"{METRIC_PREFIX}_{name}{suffix}{_labels(bot=bot, mode=self.mode, **labels)} {value}")
+        
+        with self._lock:
+            questions = [self.questions[index] for index in sorted(self.questions)]
+            line_latencies = {endpoint: list(values) for endpoint, values in self.line_latencies.items()}
+            line_status_counts = {endpoint: dict(counts) for endpoint, counts in self.line_status_counts.items()}
+            delivery = dict(self.delivery, requests_per_second=self._delivery_rate())
+        
+        metric("run_duration_seconds", "gauge", "Total run time in seconds.",
+               [("", {}, round(self.total_seconds or 0.0, 3))])
+        metric("run_timestamp_seconds", "gauge", "Unix time the run started.",
+               [("", {}, round(self._started_at, 3))])
+        metric("grok_question_duration_seconds", "gauge", "Grok answer time per question.",
+               [("", {"question": q["index"], "status": q["status"]}, q["seconds"]) for q in questions])
+        metric("grok_answer_chars", "gauge", "Answer length in characters per question.",
+               [("", {"question": q["index"]}, q["answer_chars"]) for q in questions])
+        metric("grok_tokens", "gauge", "Tokens used per question.",
+               [("", {"question": q["index"], "type": kind}, q[f"{kind}_tokens"])
+                for q in questions for kind in ("prompt", "completion", "reasoning")])
+        metric("grok_search_calls", "gauge", "Server-side search tool calls per question.",
+               [("", {"question": q["index"], "tool": tool}, q[f"{tool}_search_calls"])
+                for q in questions for tool in ("web", "x")])
+        metric("line_requests_total", "counter", "LINE API requests by endpoint and status (retries included).",
+               [("", {"endpoint": endpoint, "status": status}, count)
+                for endpoint, counts in line_status_counts.items() for status, count in sorted(counts.items())])
+        
+        samples = []
+        for endpoint, latencies in line_latencies.items():
+            for quantile in (0.5, 0.9, 0.99):
+                samples.append(("", {"endpoint": endpoint, "quantile": quantile},
+                                round(_percentile(latencies, quantile * 100), 4)))
+            samples.append(("_sum", {"endpoint": endpoint}, round(sum(latencies), 4)))
+            samples.append(("_count", {"endpoint": endpoint}, len(latencies)))
+        metric("line_request_duration_seconds", "summary", "LINE API request latency.", samples)
+        if delivery["requests"]:
+            metric("line_delivery_requests_per_second", "gauge", "Planned LINE requests sent per second.",
+                   [("", {"max_in_flight": delivery["max_in_flight"]}, delivery["requests_per_second"])])
+        
+        return "\n".join(lines) + "\n"
+    
+    def write(self) -> str:
+        """実行モードごとの Prometheus のテキストファイルを置き換え、JSON Lines に1行追記する（戻り値: 保存先）"""
+        if self.total_seconds is None:
+            self.finish()
+        os.makedirs(self.directory, exist_ok=True)
+        
+        # --submit・--prepare・--deliver と続けて実行しても前の実行の値が消えないよう、モードごとにファイルを分ける
+        # textfile collector が書き込み途中のファイルを読まないよう、一時ファイル経由で置き換える
+        prom_path = os.path.join(self.directory, f"{self.config.BOT_ID}_{self.mode}.prom")
+        tmp_path = f"{prom_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, prom_path)
+        
+        with open(os.path.join(self.directory, f"{self.config.BOT_ID}.jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps(self.to_dict(), ensure_ascii=False) + "\n")
+        return self.directory
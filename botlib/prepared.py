@@ -0,0 +1,74 @@
+"""
+事前生成した回答の保存・読み込み
+prepare モードで Grok の回答を保存し、deliver モードではそれを読んで LINE に送るだけにする
+"""
+
+import json
+import os
+import time
+from typing import List, Optional, Tuple, Type
+
+from botlib.config import BaseConfig
+
+
+class PreparedAnswers:
+    """事前生成した qa_pairs をBotごとにファイルへ保存するクラス"""
+    
+    def __init__(self, config: Type[BaseConfig]):
+        self.config = config
+        self.path = os.path.join(config.STATE_DIR, "prepared", f"{config.BOT_ID}.json")
+    
+    def _read(self) -> Optional[dict]:
+        """保存内容を読み込む（なければNone）"""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def _write(self, entry: dict) -> None:
+        """保存内容を書き込む"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+    
+    def save(self, qa_pairs: List[Tuple[str, str]]) -> None:
+        """回答を保存"""
+        self._write({
+            "bot_id": self.config.BOT_ID,
+            "prepared_at": time.time(),
+            "delivered_at": None,
+            "qa_pairs": [list(pair) for pair in qa_pairs],
+        })
+    
+    def _is_fresh(self, entry: dict) -> bool:
+        """配信に使える期限内かどうか"""
+        return time.time() - entry.get("prepared_at", 0) <= self.config.PREPARED_MAX_AGE_SECONDS
+    
+    def load(self) -> Tuple[Optional[List[Tuple[str, str]]], str]:
+        """配信可能な回答を読み込む（2つ目の戻り値は読み込めなかった理由）"""
+        entry = self._read()
+        if entry is None:
+            return None, "事前生成された回答がありません"
+        if not self._is_fresh(entry):
+            age = time.time() - entry.get("prepared_at", 0)
+            return None, f"事前生成された回答が古すぎます（{age / 3600:.1f}時間前）"
+        if entry.get("delivered_at"):
+            return None, "事前生成された回答は配信済みです"
+        
+        return [tuple(pair) for pair in entry["qa_pairs"]], ""
+    
+    def is_delivered(self) -> bool:
+        """期限内の事前生成分がすでに配信済みかどうか（古い分は対象外）"""
+        entry = self._read()
+        return bool(entry and entry.get("delivered_at") and self._is_fresh(entry))
+    
+    def mark_delivered(self) -> None:
+        """保存中の回答を配信済みにする（同じ回答の二重配信を防ぐ）"""
+        entry = self._read()
+        if entry is None:
+            return
+        entry["delivered_at"] = time.time()
+        self._write(entry)
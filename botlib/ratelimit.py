@@ -0,0 +1,70 @@
+"""
+レート制限とリトライ
+"""
+
+import random
+import threading
+import time
+
+
+class TokenBucket:
+    """トークンバケット方式のレート制限（スレッドセーフ）
+    
+    rate 回/秒のペースでトークンが補充され、最大 capacity 個までためられる。
+    429 を受け取ったときは pause() で全スレッドの送信をまとめて止められる。
+    rate が0以下ならレートは制限せず、pause() による停止だけを行う。
+    """
+    
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+    
+    def _refill(self, now: float) -> None:
+        """経過時間に応じてトークンを補充"""
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+    
+    def acquire(self) -> float:
+        """トークンを1つ取得（足りなければ待つ）。待った秒数を返す"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self.rate <= 0:
+                    return waited
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                else:
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+    
+    def pause(self, seconds: float) -> None:
+        """指定秒数、すべての取得を止める（Retry-After への対応）"""
+        with self._lock:
+            now = time.monotonic()
+            self._paused_until = max(self._paused_until, now + seconds)
+            self._tokens = 0
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """ジッター付き指数バックオフの待ち時間（full jitter）"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def parse_retry_after(value: str) -> float:
+    """Retry-After ヘッダーの秒数を取得（解釈できなければ0）"""
+    if not value:
+        return 0.0
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return 0.0
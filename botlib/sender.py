@@ -0,0 +1,140 @@
+"""
+LINE送信の並行実行
+宛先（キー）ごとに送信の順番を保ちながら、最大 K 件のリクエストを並行して送る。
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Deque, Dict, Hashable, Optional, Set
+
+from botlib.console import get_log_prefix, safe_print, set_log_prefix
+from botlib.metrics import get_current_metrics, set_current_metrics
+
+
+class OrderedSender:
+    """キーごとに順番を保って送信を並行実行するクラス
+
+    同じキー（push なら User ID）の送信は submit した順に1件ずつ実行し、別のキーの送信は
+    最大 max_in_flight 件まで並行して実行する。未実行の送信は max_in_flight の数倍までしか
+    ためないので、送信予定を順に読みながら submit しても全件がメモリに載ることはない。
+    
+    送信が失敗した（例外を送出した・False を返した）キーは保留にし、以降の送信は実行しない
+    （後の送信が先に届いて順番が入れ替わらないよう、失敗した送信と一緒に後から送り直す）。
+    """
+    
+    # 未実行の送信をためておける数（max_in_flight に対する倍率）
+    BACKLOG_FACTOR = 4
+    
+    def __init__(self, max_in_flight: int):
+        self.max_in_flight = max(1, max_in_flight)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._queues: Dict[Hashable, Deque[Callable[[], Optional[bool]]]] = {}
+        self._held_keys: Set[Hashable] = set()
+        self._pending = 0
+        self._slots = threading.BoundedSemaphore(self.max_in_flight * self.BACKLOG_FACTOR)
+        
+        # ワーカースレッドでも、呼び出し元と同じログ接頭辞・メトリクスに記録する
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_in_flight,
+            initializer=OrderedSender._init_worker,
+            initargs=(get_log_prefix(), get_current_metrics())
+        )
+        
+        # 達成した送信レートの計測用（held は保留にして実行しなかった送信の数）
+        self.count = 0
+        self.held = 0
+        self._started_at: Optional[float] = None
+        self._finished_at: Optional[float] = None
+    
+    @staticmethod
+    def _init_worker(prefix: str, metrics) -> None:
+        """ワーカースレッドの初期化"""
+        set_log_prefix(prefix)
+        set_current_metrics(metrics)
+    
+    def submit(self, key: Hashable, send: Callable[[], Optional[bool]]) -> None:
+        """送信を1件追加（同じキーの送信が実行中・待機中なら、その後に実行する。保留中のキーなら実行しない）"""
+        with self._lock:
+            if key in self._held_keys:
+                self.held += 1
+                return
+        self._slots.acquire()
+        with self._lock:
+            if self._started_at is None:
+                self._started_at = time.perf_counter()
+            self._pending += 1
+            queue = self._queues.get(key)
+            if queue is not None:
+                queue.append(send)
+                return
+            self._queues[key] = deque([send])
+        self._executor.submit(self._drain, key)
+    
+    def _drain(self, key: Hashable) -> None:
+        """キーの送信を順に実行（キューが空になったら終了。保留になったキーの残りは実行せずに捨てる）"""
+        while True:
+            with self._lock:
+                queue = self._queues[key]
+                if not queue:
+                    del self._queues[key]
+                    return
+                send = queue.popleft()
+                held = key in self._held_keys
+            
+            ok = True
+            try:
+                if not held:
+                    ok = send() is not False
+            except Exception as e:
+                ok = False
+                safe_print(f"❌ 送信エラー: {e}")
+            finally:
+                self._slots.release()
+                with self._lock:
+                    if held:
+                        self.held += 1
+                    else:
+                        self.count += 1
+                        self._finished_at = time.perf_counter()
+                    if not ok:
+                        self._held_keys.add(key)
+                    self._pending -= 1
+                    if self._pending == 0:
+                        self._idle.notify_all()
+    
+    def hold(self, key: Hashable) -> None:
+        """キーを保留にする（以降に submit した送信・待機中の送信を実行しない）"""
+        with self._lock:
+            self._held_keys.add(key)
+    
+    def is_held(self, key: Hashable) -> bool:
+        """キーが保留中か"""
+        with self._lock:
+            return key in self._held_keys
+    
+    def wait(self) -> None:
+        """submit 済みの送信がすべて終わるまで待つ"""
+        with self._lock:
+            while self._pending:
+                self._idle.wait()
+    
+    def close(self) -> None:
+        """送信がすべて終わるまで待ってワーカーを止める"""
+        self.wait()
+        self._executor.shutdown(wait=True)
+    
+    @property
+    def elapsed(self) -> float:
+        """最初の submit から最後の送信が終わるまでの秒数"""
+        if self._started_at is None or self._finished_at is None:
+            return 0.0
+        return self._finished_at - self._started_at
+    
+    def rate_summary(self) -> str:
+        """達成した送信レートを文字列で取得（ログ表示用）"""
+        elapsed = self.elapsed
+        rate = f"{self.count / elapsed:.1f} req/s" if elapsed > 0 else "- req/s"
+        return f"{self.count}リクエスト / {elapsed:.2f}秒 / {rate}（同時送信数 {self.max_in_flight}）"
@@ -0,0 +1,165 @@
+"""
+LINE送信用のテキスト分割
+LINEのテキストメッセージは1件5000文字（UTF-16換算）までなので、長い回答は段落・箇条書きの切れ目で分割する。
+絵文字（ZWJ結合・肌の色・国旗など）や濁点の結合文字の途中では切らない。
+"""
+
+import unicodedata
+from typing import List
+
+# LINEのテキストメッセージ1件あたりの最大文字数（UTF-16のコード単位で数える）
+LINE_TEXT_MAX_CHARS = 5000
+
+# 区切り候補（優先度の高い順）。前半の区切りは limit の半分より後ろにあるときだけ使う
+_PREFERRED_SEPARATORS = ("\n\n", "\n【", "\n■", "\n●", "\n・", "\n- ", "\n")
+_FALLBACK_SEPARATORS = ("。", "！", "？", "!", "?", "、", " ")
+
+_ZWJ = "\u200d"
+
+
+def text_length(text: str) -> int:
+    """LINEの文字数制限で数える長さ（UTF-16のコード単位数）"""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _prefix_index(text: str, limit: int) -> int:
+    """UTF-16換算で limit 以内に収まる先頭部分の長さ（コードポイント数）"""
+    if text_length(text) <= limit:
+        return len(text)
+    units = 0
+    for i, ch in enumerate(text):
+        units += 2 if ord(ch) > 0xFFFF else 1
+        if units > limit:
+            return i
+    return len(text)
+
+
+def _is_extender(ch: str) -> bool:
+    """直前の文字とくっついて1文字に見える文字か（結合文字・異体字セレクタ・肌の色など）"""
+    code = ord(ch)
+    return (
+        ch == _ZWJ
+        or 0xFE00 <= code <= 0xFE0F        # 異体字セレクタ
+        or 0xE0100 <= code <= 0xE01EF      # 異体字セレクタ（補助）
+        or 0x1F3FB <= code <= 0x1F3FF      # 肌の色
+        or 0xE0020 <= code <= 0xE007F      # タグ文字（旗の絵文字）
+        or unicodedata.category(ch) in ("Mn", "Me", "Mc")
+    )
+
+
+def _is_regional_indicator(ch: str) -> bool:
+    """国旗絵文字を構成する地域指示記号か"""
+    return 0x1F1E6 <= ord(ch) <= 0x1F1FF
+
+
+def safe_cut_index(text: str, index: int) -> int:
+    """index の位置で切ると書記素（見た目の1文字）が割れる場合、手前にずらす"""
+    while 0 < index < len(text):
+        if _is_extender(text[index]) or text[index - 1] == _ZWJ:
+            index -= 1
+            continue
+        if _is_regional_indicator(text[index]) and _is_regional_indicator(text[index - 1]):
+            # 直前に続く地域指示記号の数が奇数なら、index は国旗のペアの途中
+            run = 0
+            while index - run - 1 >= 0 and _is_regional_indicator(text[index - run - 1]):
+                run += 1
+            if run % 2 == 1:
+                index -= 1
+                continue
+        break
+    return index
+
+
+def find_split_point(text: str, limit: int) -> int:
+    """limit 以内で区切りのよい位置（段落 → 見出し・箇条書き → 改行 → 文末）を探す"""
+    end = _prefix_index(text, limit)
+    if end >= len(text):
+        return len(text)
+    
+    window = text[:end]
+    for separator in _PREFERRED_SEPARATORS:
+        # 見出し・箇条書きの区切りは、記号の前（改行の直後）で切る
+        pos = window.rfind(separator)
+        if pos >= end // 2:
+            return pos + (len(separator) if separator.strip() == "" else 1)
+    # 後半に段落・改行がなければ、一番後ろにある文末などで切る
+    best = 0
+    for separator in _PREFERRED_SEPARATORS + _FALLBACK_SEPARATORS:
+        pos = window.rfind(separator)
+        if pos > 0:
+            best = max(best, pos + (len(separator) if separator.strip() == "" else 1))
+    if best > 0:
+        return best
+    
+    # 区切りがなければ書記素の境界で切る（1文字が limit より長い場合はその文字で切る）
+    cut = safe_cut_index(text, end)
+    return cut if cut > 0 else max(end, 1)
+
+
+def split_text(text: str, limit: int) -> List[str]:
+    """テキストを limit 以内の塊に分割"""
+    pieces = []
+    rest = text.strip()
+    while rest:
+        pos = find_split_point(rest, limit)
+        piece = rest[:pos].strip()
+        if piece:
+            pieces.append(piece)
+        rest = rest[pos:].strip()
+    return pieces
+
+
+def format_answer_messages(index: int, question_display: str, answer: str,
+                           limit: int = LINE_TEXT_MAX_CHARS) -> List[str]:
+    """質問1件分の送信メッセージを作成（長い回答は分割し、「（2/3）」のように番号を付ける）"""
+    header = f"【質問{index}】{question_display}"
+    if text_length(header) + 2 + text_length(answer) <= limit:
+        return [f"{header}\n\n{answer}"]
+    
+    # 番号の桁が増えても収まるよう、見出しの長さに余裕を持たせて分割する
+    body_limit = limit - text_length(f"{header}（99/99）\n\n")
+    pieces = split_text(answer, body_limit)
+    total = len(pieces)
+    messages = []
+    for part, piece in enumerate(pieces, 1):
+        if part == 1:
+            messages.append(f"{header}（1/{total}）\n\n{piece}")
+        else:
+            messages.append(f"【質問{index}】（{part}/{total}）\n\n{piece}")
+    return messages
+
+
+class StreamChunker:
+    """ストリーミングで届くテキストを、LINEで送れる大きさの塊にまとめるクラス
+
+    段落の区切りが来た時点で min_chars 以上たまっていれば1通分として取り出す。
+    """
+    
+    def __init__(self, min_chars: int, max_chars: int = LINE_TEXT_MAX_CHARS):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.buffer = ""
+    
+    def feed(self, text: str) -> List[str]:
+        """テキストを追加し、送信できる塊があれば返す"""
+        self.buffer += text
+        pieces = []
+        
+        while text_length(self.buffer) > self.max_chars:
+            pos = find_split_point(self.buffer, self.max_chars)
+            pieces.append(self.buffer[:pos])
+            self.buffer = self.buffer[pos:]
+        
+        if text_length(self.buffer) >= self.min_chars:
+            pos = self.buffer.rfind("\n\n")
+            if pos > 0 and text_length(self.buffer[:pos]) >= self.min_chars:
+                pieces.append(self.buffer[:pos + 2])
+                self.buffer = self.buffer[pos + 2:]
+        
+        return [piece.strip() for piece in pieces if piece.strip()]
+    
+    def flush(self) -> List[str]:
+        """残りのテキストをすべて返す"""
+        rest = self.buffer.strip()
+        self.buffer = ""
+        return [rest] if rest else []
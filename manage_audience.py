@@ -0,0 +1,82 @@
+"""
+配信対象の登録簿（SQLite）の管理
+AUDIENCE_SOURCE=sqlite のBotは、ここで登録した User ID に配信する
+
+使い方:
+    python manage_audience.py subscribe 3 Uxxxxxxxx Uyyyyyyyy
+    python manage_audience.py subscribe 3 --file user_ids.txt      # 1行に1つ（"-" なら標準入力）
+    python manage_audience.py subscribe 3 --env LINE_USER_IDS_3    # カンマ区切りの環境変数から移行
+    python manage_audience.py unsubscribe 3 Uxxxxxxxx
+    python manage_audience.py count 3
+"""
+
+import argparse
+import os
+import sys
+from typing import Iterator
+
+from botlib.audience import AudienceStore
+from botlib.config import BaseConfig
+from run_bots import resolve_bot_names
+
+
+# ========================================
+# 登録・解除
+# ========================================
+
+def read_user_ids(args) -> Iterator[str]:
+    """引数・ファイル・環境変数から User ID を順に読む（ファイルは1行ずつ読み、全件は読み込まない）"""
+    yield from args.user_ids
+    if args.file:
+        f = sys.stdin if args.file == "-" else open(args.file, encoding="utf-8")
+        try:
+            yield from f
+        finally:
+            if f is not sys.stdin:
+                f.close()
+    if args.env:
+        yield from (os.environ.get(args.env) or "").split(",")
+
+
+# ========================================
+# エントリーポイント
+# ========================================
+
+def main():
+    """メイン関数"""
+    parser = argparse.ArgumentParser(description="配信対象の登録簿（SQLite）を管理")
+    parser.add_argument("--db", default=None,
+                        help="登録簿のファイル（既定: AUDIENCE_DB または BOT_STATE_DIR/audience.sqlite3）")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for command, help_text in (("subscribe", "配信対象に登録"), ("unsubscribe", "配信対象から解除")):
+        sub = commands.add_parser(command, help=help_text)
+        sub.add_argument("bot", help="Bot（例: 3 / bot3）")
+        sub.add_argument("user_ids", nargs="*", help="LINE User ID")
+        sub.add_argument("--file", help="User ID を1行に1つ書いたファイル（\"-\" なら標準入力）")
+        sub.add_argument("--env", help="User ID をカンマ区切りで持つ環境変数の名前（例: LINE_USER_IDS_3）")
+    sub = commands.add_parser("count", help="配信対象の人数を表示")
+    sub.add_argument("bot", help="Bot（例: 3 / bot3）")
+    args = parser.parse_args()
+    
+    try:
+        bot_id = resolve_bot_names([args.bot])[0]
+    except ValueError as e:
+        parser.error(str(e))
+    
+    path = args.db or BaseConfig.AUDIENCE_DB or os.path.join(BaseConfig.STATE_DIR, "audience.sqlite3")
+    store = AudienceStore(path, bot_id)
+    try:
+        if args.command == "subscribe":
+            added = store.subscribe(read_user_ids(args))
+            print(f"✅ {bot_id}: {added}人を登録しました（合計 {store.count()}人）")
+        elif args.command == "unsubscribe":
+            removed = store.unsubscribe(read_user_ids(args))
+            print(f"✅ {bot_id}: {removed}人を解除しました（合計 {store.count()}人）")
+        else:
+            print(f"{bot_id}: {store.count()}人")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
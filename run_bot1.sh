@@ -1,3 +1,3 @@
 #!/bin/bash
-pip install requests xai-sdk
+pip install requests xai-sdk==1.20.0
 python bot1_stock.py
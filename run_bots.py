@@ -0,0 +1,133 @@
+"""
+複数Botの一括実行
+指定したBotを1つのプロセスで同時に実行し、Grokクライアント・HTTP接続プール・ログを共有する
+
+使い方:
+    python run_bots.py 3 4          # Bot3 と Bot4 を実行
+    python run_bots.py bot1 bot6    # 名前でも指定可能
+    python run_bots.py --all        # 全Botを実行
+    python run_bots.py --submit 5 6    # 質問を deferred で先に投入
+    python run_bots.py --prepare 3 4   # 回答を事前生成して保存
+    python run_bots.py --deliver 3 4   # 事前生成した回答を配信
+    python run_bots.py --resume 3 4    # 途中で止まった配信の未送信分だけを再送
+"""
+
+import argparse
+import importlib
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from botlib import GrokClientManager, LineAPI
+from botlib.cli import add_mode_arguments
+from botlib.config import env_int
+from botlib.console import safe_print, set_log_prefix
+
+
+# ========================================
+# 設定・定数
+# ========================================
+
+# Bot名 → モジュール名
+BOT_MODULES: Dict[str, str] = {
+    "bot1": "bot1_stock",
+    "bot2": "bot2_ai_tech",
+    "bot3": "bot3_japan_news",
+    "bot4": "bot4_hololive",
+    "bot5": "bot5_anime",
+    "bot6": "bot6_soccer",
+}
+
+# 同時に実行するBot数の上限
+BOT_MAX_CONCURRENCY = env_int('BOT_MAX_CONCURRENCY', 3)
+
+
+# ========================================
+# 実行処理
+# ========================================
+
+def resolve_bot_names(names: List[str]) -> List[str]:
+    """引数（"3" / "bot3" / "bot3_japan_news"）をBot名に変換"""
+    resolved = []
+    for name in names:
+        key = name.strip().lower()
+        if key.endswith(".py"):
+            key = key[:-3]
+        if key.isdigit():
+            key = f"bot{key}"
+        key = key.split("_")[0]
+        if key not in BOT_MODULES:
+            raise ValueError(f"不明なBotです: {name}（指定可能: {', '.join(BOT_MODULES)}）")
+        if key not in resolved:
+            resolved.append(key)
+    return resolved
+
+
+def run_bot(name: str, mode: str = "run") -> bool:
+    """1つのBotを実行（例外は握りつぶして他のBotに影響させない）"""
+    prefix = f"[{name}] "
+    set_log_prefix(prefix)
+    try:
+        module = sys.modules[BOT_MODULES[name]]
+        bot = module.Bot(log_prefix=prefix)
+        bot.execute(mode)
+        return True
+    
+    except Exception as e:
+        safe_print(f"❌ Bot実行エラー: {e}")
+        return False
+
+
+def run_bots(names: List[str], mode: str = "run") -> Dict[str, bool]:
+    """複数のBotを同時実行数の上限付きで実行"""
+    # import はスレッドを起動する前にまとめて行う
+    for name in names:
+        importlib.import_module(BOT_MODULES[name])
+    
+    max_workers = max(1, min(BOT_MAX_CONCURRENCY, len(names)))
+    safe_print(f"=== {len(names)}個のBotを実行（モード: {mode} / 同時実行数: {max_workers}）: {', '.join(names)} ===")
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = dict(zip(names, executor.map(lambda name: run_bot(name, mode), names)))
+    elapsed = time.perf_counter() - start
+    
+    set_log_prefix("")
+    safe_print(f"\n=== 全Bot完了（{elapsed:.1f}秒） ===")
+    for name, ok in results.items():
+        safe_print(f"{'✅' if ok else '❌'} {name}")
+    return results
+
+
+# ========================================
+# エントリーポイント
+# ========================================
+
+def main():
+    """メイン関数"""
+    parser = argparse.ArgumentParser(description="複数Botを1プロセスで実行")
+    parser.add_argument("bots", nargs="*", help="実行するBot（例: 3 4 / bot3 bot4）")
+    parser.add_argument("--all", action="store_true", help="全Botを実行")
+    add_mode_arguments(parser)
+    args = parser.parse_args()
+    
+    if args.all:
+        names = list(BOT_MODULES)
+    elif args.bots:
+        names = resolve_bot_names(args.bots)
+    else:
+        parser.error("実行するBotを指定してください")
+    
+    try:
+        results = run_bots(names, args.mode)
+    finally:
+        LineAPI.close_all()
+        GrokClientManager.close_all()
+    
+    if not all(results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3 @@
+#!/bin/bash
+pip install requests xai-sdk==1.20.0
+python run_bots.py "$@"
@@ -0,0 +1,68 @@
+"""
+botlib.journal（配信ジャーナル）のテスト
+"""
+
+import pytest
+
+from botlib.config import BaseConfig
+from botlib.journal import DeliveryJournal
+
+
+@pytest.fixture
+def journal(tmp_path):
+    class Config(BaseConfig):
+        STATE_DIR = str(tmp_path)
+        BOT_ID = "test"
+    
+    journal = DeliveryJournal(Config)
+    yield journal
+    journal.close()
+
+
+def plan_multicast(journal: DeliveryJournal, recipients):
+    """multicast 1件の実行を記録し、(run_id, リクエスト) を返す"""
+    run_id = journal.start_run([("質問", "回答")], [["メッセージ"]])
+    journal.plan_requests(run_id, [(0, "multicast", recipients)])
+    return run_id, next(journal.iter_pending(run_id))
+
+
+def test_replace_request_journals_every_push_before_replacing(journal):
+    users = [f"U{i}" for i in range(50)]
+    run_id, multicast = plan_multicast(journal, users)
+    
+    pushes = journal.replace_request(run_id, multicast, (("push", [user]) for user in users))
+    
+    assert [push.recipients for push in pushes] == [[user] for user in users]
+    assert [request.seq for request in journal.iter_pending(run_id)] == [push.seq for push in pushes]
+    assert journal.count_unsent(run_id) == 50
+
+
+def test_replace_request_failure_keeps_the_original_pending(journal):
+    users = [f"U{i}" for i in range(50)]
+    run_id, multicast = plan_multicast(journal, users)
+    
+    def rows():
+        for i, user in enumerate(users):
+            if i == 10:
+                raise RuntimeError("落ちた")
+            yield "push", [user]
+    
+    with pytest.raises(RuntimeError):
+        journal.replace_request(run_id, multicast, rows())
+    
+    # push は1件も記録されず、multicast が未送信のまま残るので --resume で全員に送り直せる
+    assert list(journal.iter_pending(run_id)) == [multicast]
+    assert journal.count_unsent(run_id) == 1
+
+
+def test_iter_pending_returns_batches_in_order(journal):
+    run_id = journal.start_run([("質問", "回答")], [["1"], ["2"]])
+    journal.plan_requests(run_id, [(0, "multicast", ["U1", "U2"]), (1, "multicast", ["U1", "U2"])])
+    first, second = journal.iter_pending(run_id)
+    
+    # 1つ目のまとまりの push 再送は2つ目より後に登録されるが、まとまり順に返す
+    pushes = journal.replace_request(run_id, first, [("push", ["U1"]), ("push", ["U2"])])
+    pending = list(journal.iter_pending(run_id))
+    assert pending == pushes + [second]
+    assert list(journal.iter_pending(run_id, first_batch=1)) == [second]
+    assert journal.unsent_before(run_id, 1) == pushes
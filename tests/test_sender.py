@@ -0,0 +1,168 @@
+"""
+botlib.sender（キーごとに順番を保つ並行送信）のテスト
+"""
+
+import threading
+from collections import defaultdict
+
+from botlib.sender import OrderedSender
+
+# テストがいつまでも止まらないよう、待機にはすべて上限を付ける
+TIMEOUT = 5
+
+
+class FakeLine:
+    """送信した順番を記録し、指定した送信をイベントで止められる偽の送信先"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sent = []
+        self.started = defaultdict(threading.Event)
+        self.finished = defaultdict(threading.Event)
+        self.gates = {}
+        self.fail = set()
+    
+    def block(self, item: str) -> threading.Event:
+        """item の送信を、返したイベントがセットされるまで止める"""
+        self.gates[item] = threading.Event()
+        return self.gates[item]
+    
+    def send(self, item: str) -> None:
+        self.started[item].set()
+        if item in self.gates:
+            assert self.gates[item].wait(TIMEOUT)
+        with self.lock:
+            self.sent.append(item)
+        self.finished[item].set()
+        if item in self.fail:
+            raise RuntimeError(f"{item} failed")
+    
+    def sent_for(self, key: str):
+        with self.lock:
+            return [item for item in self.sent if item.startswith(key)]
+
+
+def submit_all(sender: OrderedSender, line: FakeLine, items) -> None:
+    for item in items:
+        sender.submit(item[0], lambda item=item: line.send(item))
+
+
+def test_same_key_keeps_order_while_other_keys_continue():
+    line = FakeLine()
+    gate = line.block("A1")
+    sender = OrderedSender(4)
+    submit_all(sender, line, ["A1", "A2", "A3", "B1", "C1", "B2", "C2"])
+    
+    # A1 が止まっている間も、別のキーの送信は最後まで進む
+    assert line.started["A1"].wait(TIMEOUT)
+    done = threading.Event()
+    watcher = threading.Thread(target=lambda: (sender.wait(), done.set()))
+    watcher.start()
+    assert line.finished["B2"].wait(TIMEOUT)
+    assert line.finished["C2"].wait(TIMEOUT)
+    assert line.sent_for("B") == ["B1", "B2"]
+    assert line.sent_for("C") == ["C1", "C2"]
+    assert line.sent_for("A") == []
+    assert not done.is_set()
+    
+    gate.set()
+    sender.close()
+    watcher.join(TIMEOUT)
+    assert done.is_set()
+    assert line.sent_for("A") == ["A1", "A2", "A3"]
+    assert sender.count == 7
+
+
+def test_failed_send_holds_later_sends_for_the_key():
+    line = FakeLine()
+    line.fail = {"A2", "B1"}
+    gate = line.block("A1")
+    sender = OrderedSender(2)
+    submit_all(sender, line, ["A1", "A2", "A3", "A4", "B1", "B2", "C1", "C2"])
+    gate.set()
+    sender.wait()
+    
+    # 失敗した後の送信は、順番が入れ替わらないよう実行せずに保留する（別のキーはそのまま送る）
+    assert line.sent_for("A") == ["A1", "A2"]
+    assert line.sent_for("B") == ["B1"]
+    assert line.sent_for("C") == ["C1", "C2"]
+    assert sender.is_held("A") and sender.is_held("B") and not sender.is_held("C")
+    
+    # 保留になった後に submit した送信も実行しない
+    submit_all(sender, line, ["A5", "C3"])
+    sender.close()
+    assert line.sent_for("A") == ["A1", "A2"]
+    assert line.sent_for("C") == ["C1", "C2", "C3"]
+    assert sender.count == 6
+    assert sender.held == 4
+
+
+def test_send_returning_false_holds_the_key():
+    sent = []
+    sender = OrderedSender(1)
+    sender.submit("A", lambda: sent.append("A1") or False)
+    sender.submit("A", lambda: sent.append("A2"))
+    sender.close()
+    
+    assert sent == ["A1"]
+    assert sender.held == 1
+
+
+def test_hold_before_submit_skips_the_key():
+    sent = []
+    sender = OrderedSender(2)
+    sender.hold("A")
+    sender.submit("A", lambda: sent.append("A1"))
+    sender.submit("B", lambda: sent.append("B1"))
+    sender.close()
+    
+    assert sent == ["B1"]
+    assert sender.held == 1
+
+
+def test_same_key_never_runs_concurrently():
+    lock = threading.Lock()
+    active = {}
+    overlaps = []
+    order = {}
+    
+    def send(key: str, n: int) -> None:
+        with lock:
+            if active.get(key):
+                overlaps.append((key, n))
+            active[key] = True
+            order.setdefault(key, []).append(n)
+        threading.Event().wait(0.001)
+        with lock:
+            active[key] = False
+    
+    sender = OrderedSender(8)
+    for n in range(20):
+        for key in "ABCDEFGH":
+            sender.submit(key, lambda key=key, n=n: send(key, n))
+    sender.close()
+    
+    assert overlaps == []
+    assert all(numbers == list(range(20)) for numbers in order.values())
+
+
+def test_submit_blocks_when_backlog_is_full():
+    line = FakeLine()
+    gate = line.block("A1")
+    sender = OrderedSender(1)
+    backlog = sender.max_in_flight * OrderedSender.BACKLOG_FACTOR
+    submit_all(sender, line, [f"A{n}" for n in range(1, backlog + 1)])
+    assert line.started["A1"].wait(TIMEOUT)
+    
+    # 未実行の送信が上限に達しているので、次の submit は送信が終わるまで戻らない
+    submitted = threading.Event()
+    extra = threading.Thread(target=lambda: (sender.submit("B", lambda: line.send("B1")), submitted.set()))
+    extra.start()
+    assert not submitted.wait(0.1)
+    
+    gate.set()
+    extra.join(TIMEOUT)
+    assert submitted.is_set()
+    sender.close()
+    assert line.sent_for("A") == [f"A{n}" for n in range(1, backlog + 1)]
+    assert line.sent_for("B") == ["B1"]
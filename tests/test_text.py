@@ -0,0 +1,92 @@
+"""
+botlib.text（LINE送信用のテキスト分割）のテスト
+"""
+
+import pytest
+
+from botlib.text import LINE_TEXT_MAX_CHARS, format_answer_messages, split_text, text_length
+
+FAMILY = "\U0001F468\u200d\U0001F469\u200d\U0001F467\u200d\U0001F466"  # ZWJ で結合した家族の絵文字（UTF-16で11）
+THUMBS_UP = "\U0001F44D\U0001F3FD"                                     # 肌の色付き（UTF-16で4）
+FLAG = "\U0001F1EF\U0001F1F5"                                          # 地域指示記号2つで1つの国旗（UTF-16で4）
+GA = "\u304b\u3099"                                                    # 結合文字の濁点で表した「が」（UTF-16で2）
+
+
+def assert_split(text: str, limit: int, grapheme: str) -> None:
+    """分割結果がすべて limit 以内で、書記素の途中で切れておらず、つなげると元に戻るか"""
+    pieces = split_text(text, limit)
+    assert "".join(pieces) == text
+    for piece in pieces:
+        assert text_length(piece) <= limit
+        assert piece.replace(grapheme, "") == ""
+
+
+def test_text_length_counts_utf16_code_units():
+    assert text_length("あいう") == 3
+    assert text_length("😀") == 2
+    assert text_length(FAMILY) == 11
+    assert text_length(GA) == 2
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 5, 100])
+def test_surrogate_pairs_are_not_split(limit):
+    if limit == 1:
+        # 1文字が limit より長いときは、その文字だけで1つの塊にする
+        assert split_text("😀😀", limit) == ["😀", "😀"]
+        return
+    assert_split("😀" * 50, limit, "😀")
+
+
+@pytest.mark.parametrize("grapheme", [FAMILY, THUMBS_UP, FLAG, GA])
+@pytest.mark.parametrize("limit", [12, 23, 50])
+def test_grapheme_clusters_are_not_split(grapheme, limit):
+    assert_split(grapheme * 40, limit, grapheme)
+
+
+def test_flags_keep_regional_indicator_pairs():
+    # 奇数個目の位置で切ると国旗の組み合わせがずれるので、必ずペアの境界で切る
+    pieces = split_text(FLAG * 10, 7)
+    assert all(piece == FLAG for piece in pieces)
+
+
+def test_combining_dakuten_stays_with_base_character():
+    pieces = split_text("あ" + GA * 5, 4)
+    assert "".join(pieces) == "あ" + GA * 5
+    assert not any(piece.startswith("\u3099") for piece in pieces)
+
+
+def test_text_exactly_at_limit_is_not_split():
+    text = "あ" * 98 + "😀"
+    assert text_length(text) == 100
+    assert split_text(text, 100) == [text]
+
+
+def test_text_one_over_limit_is_split():
+    text = "あ" * 99 + "😀"
+    pieces = split_text(text, 100)
+    assert pieces == ["あ" * 99, "😀"]
+
+
+def test_split_prefers_paragraph_boundary():
+    first = "あ" * 60
+    second = "い" * 60
+    assert split_text(f"{first}\n\n{second}", 100) == [first, second]
+
+
+def test_answer_exactly_at_limit_is_one_message():
+    header = "【質問1】テスト"
+    answer = "あ" * (LINE_TEXT_MAX_CHARS - text_length(header) - 2)
+    messages = format_answer_messages(1, "テスト", answer)
+    assert messages == [f"{header}\n\n{answer}"]
+    assert text_length(messages[0]) == LINE_TEXT_MAX_CHARS
+
+
+def test_answer_over_limit_is_numbered_and_fits():
+    header = "【質問1】テスト"
+    answer = "😀" * ((LINE_TEXT_MAX_CHARS - text_length(header) - 2) // 2 + 1)
+    messages = format_answer_messages(1, "テスト", answer)
+    assert len(messages) == 2
+    assert messages[0].startswith(f"{header}（1/2）\n\n")
+    assert messages[1].startswith("【質問1】（2/2）\n\n")
+    assert all(text_length(message) <= LINE_TEXT_MAX_CHARS for message in messages)
+    assert "".join(message.split("\n\n", 1)[1] for message in messages) == answer